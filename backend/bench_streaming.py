@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+"""How fast FieldReader reads a streamed move, and whether it still reads it right.
+
+    cd backend && venv/bin/python bench_streaming.py
+    venv/bin/python bench_streaming.py 20000        # more documents
+
+FieldReader runs on every text delta of every streamed turn, on the request thread, with
+the GIL held. It used to go one character at a time; now it jumps between the characters
+that matter. The old scanner is kept here, verbatim, as the baseline - both to measure
+against and to check against: every document is fed to both in the same random pieces,
+and any difference in what they report is printed and fails the run.
+
+No network, no API key. The documents are made up, shaped like real moves: short codes
+first, a reply of a sentence or two, escapes and the odd \\u sequence, and a nested
+train of thought with brackets inside its strings.
+"""
+
+import json
+import random
+import sys
+import time
+
+from engine.streaming import _ESCAPES, FieldReader
+
+
+class _CharReader:
+    """The scanner FieldReader replaced: one trip round the loop per character."""
+
+    def __init__(self):
+        self._state = "seek"
+        self._key = ""
+        self._field = None
+        self._escape = False
+        self._hex = None      # non-None while collecting a \uXXXX escape
+        self._depth = 0
+        self._in_nested_string = False
+        self.values = {}
+
+    def feed(self, chunk):
+        pending = {}
+        finished = []
+
+        def emit(text):
+            pending[self._field] = pending.get(self._field, "") + text
+            self.values[self._field] += text
+
+        for ch in chunk:
+            state = self._state
+
+            if state == "seek":
+                # Between tokens at the top level. Braces, commas and whitespace are
+                # all noise; a quote starts a key.
+                if ch == '"':
+                    self._state, self._key = "key", ""
+
+            elif state == "key":
+                if self._escape:
+                    self._key += _ESCAPES.get(ch, ch)
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._state = "colon"
+                else:
+                    self._key += ch
+
+            elif state == "colon":
+                if ch == ":":
+                    self._state = "value"
+
+            elif state == "value":
+                if ch == '"':
+                    self._state, self._field = "string", self._key
+                    self.values.setdefault(self._field, "")
+                elif ch in "[{":
+                    # Nested. Skipped wholesale: the engine reads nothing from inside a
+                    # nested value, and descending would let a key *inside* the nesting
+                    # be mistaken for a top-level one.
+                    self._state = "nested"
+                    self._depth = 1
+                    self._in_nested_string = False
+                elif ch not in " \t\r\n":
+                    self._state = "scalar"
+
+            elif state == "string":
+                if self._hex is not None:
+                    self._hex += ch
+                    if len(self._hex) == 4:
+                        try:
+                            emit(chr(int(self._hex, 16)))
+                        except ValueError:
+                            pass          # malformed escape: drop it, keep the stream
+                        self._hex = None
+                elif self._escape:
+                    self._escape = False
+                    if ch == "u":
+                        self._hex = ""
+                    else:
+                        emit(_ESCAPES.get(ch, ch))
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    finished.append(self._field)
+                    self._state, self._field = "seek", None
+                else:
+                    emit(ch)
+
+            elif state == "scalar":
+                if ch in ",}":
+                    self._state = "seek"
+
+            elif state == "nested":
+                # Strings inside the nesting can contain braces, so track them - a
+                # bracket in a word would otherwise unbalance the depth count.
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif self._in_nested_string:
+                    if ch == '"':
+                        self._in_nested_string = False
+                elif ch == '"':
+                    self._in_nested_string = True
+                elif ch in "[{":
+                    self._depth += 1
+                elif ch in "]}":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._state = "seek"
+
+        out = [(f, d, False) for f, d in pending.items() if d]
+        out += [(f, "", True) for f in finished]
+        return out
+
+
+WORDS = ("moon apple harvest tide orbit crater cheese night lamp wolf howl silver "
+         "eclipse phase sea gravity {brace} [bracket] \"quoted\" back\\slash").split()
+
+
+def _document(rng):
+    reply = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 40)))
+    if rng.random() < 0.3:
+        reply += " caf\u00e9 \u2014 done"
+    thoughts = [[rng.choice(WORDS) for _ in range(rng.randint(1, 4))]
+                for _ in range(rng.randint(0, 3))]
+    move = {
+        "response_code": rng.choice(["OK", "ASK", "CHAT", "BROKE_RULE"]),
+        "their_word": rng.choice(WORDS),
+        "chosen_word": rng.choice(WORDS),
+        "score": rng.randint(0, 9),
+        "response": reply,
+        "train_of_thought": thoughts,
+    }
+    text = json.dumps(move, ensure_ascii=rng.random() < 0.5)
+    return text.replace("\\\\u", "\\u")     # let the \\u sequences through as escapes
+
+
+#: Piece sizes to draw from. Token by token is how the Anthropic API usually sends text;
+#: OpenAI-compatible servers often batch a few tokens into one event.
+SIZES = {
+    "token-sized": (1, 2, 3, 4, 4, 5, 6, 8, 12, 40),
+    "batched": (16, 24, 32, 48, 64),
+}
+
+
+def _pieces(rng, text, sizes=SIZES["token-sized"]):
+    """Split like a model streams: mostly a few characters, sometimes one, sometimes lots."""
+    out, i = [], 0
+    while i < len(text):
+        size = rng.choice(sizes)
+        out.append(text[i:i + size])
+        i += size
+    return out
+
+
+def _run(cls, docs):
+    started = time.perf_counter()
+    for pieces in docs:
+        reader = cls()
+        for piece in pieces:
+            reader.feed(piece)
+    return time.perf_counter() - started
+
+
+def main(n):
+    rng = random.Random(7)
+    texts = [_document(rng) for _ in range(n)]
+    print(f"{n} documents, {sum(map(len, texts)) / n:.0f} chars each")
+
+    for label, sizes in SIZES.items():
+        docs = [_pieces(rng, text, sizes) for text in texts]
+        for pieces in docs:
+            old, new = _CharReader(), FieldReader()
+            for piece in pieces:
+                a, b = old.feed(piece), new.feed(piece)
+                if a != b:
+                    print(f"MISMATCH on {piece!r} of {''.join(pieces)!r}:\n"
+                          f"  old {a}\n  new {b}")
+                    return 1
+            if old.values != new.values:
+                print(f"MISMATCH in values of {''.join(pieces)!r}")
+                return 1
+
+        old_s = min(_run(_CharReader, docs) for _ in range(3))
+        new_s = min(_run(FieldReader, docs) for _ in range(3))
+        print(f"{label} pieces, all reported identically")
+        print(f"  per character  {old_s / n * 1e6:8.1f} us/document")
+        print(f"  FieldReader    {new_s / n * 1e6:8.1f} us/document   ({old_s / new_s:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -17,10 +17,21 @@ Inside:
     providers/      the brains: anthropic, any OpenAI-compatible (local/OSS), stub
     contract.py     the frozen frontend payload shape
     turn.py         solo orchestration: pre-checks -> brain -> post-checks -> advance
+    phrases.py      lines for losses the engine decided, worded without the model (opt-in)
 
     rooms.py        who is in a room, whose turn it is, and the room's clock
+    clock.py        the one scheduler thread every room's clock runs on
+    workers.py      the bounded pool model-backed turns run on, earliest deadline first
+    cancel.py       abandoning a turn nobody is waiting for, mid-generation
     roomturn.py     the same turn with more than two people taking it
     bus.py          fan a room's events out to every browser watching it
+
+    transcript.py   the durable record of every turn, written behind the game
+    metrics.py      numbers about the process itself: queue depths, drops, latencies
+    spans.py        where one turn's time went: prompt, model calls, our own checks
+    sketch.py       turn latency quantiles per kind of turn, over a rolling hour
+    profiler.py     on-demand stack sampling of live turns, for a flamegraph
+    prewarm.py      filling the provider's prompt cache while the player thinks (opt-in)
 """
 
 from . import roomturn
@@ -10,50 +10,316 @@ the whole of the infrastructure - no Redis, no pub/sub topic, no second thing to
 deploy and keep alive. If that ever stops being true this file is the seam: swap the
 dict for a real broker and nothing above it changes.
 
-Each subscriber gets its own unbounded queue rather than sharing a cursor, so a slow
-reader delays only itself. A subscriber that goes away without unsubscribing leaks one
-queue until the room is dropped, which is a few hundred bytes and bounded by how many
-tabs a room ever had open.
+What travels is the finished server-sent event, as bytes, not the data it was made from.
+A room's state is published after nearly every action and carries the whole chain and
+member list; encoded per listener, forty spectators meant forty `json.dumps` of the same
+dict on forty threads. Encoded once in `publish`, each listener's share of the work is
+writing bytes that already exist.
+
+Each subscriber gets its own buffer rather than sharing a cursor, so a slow reader
+delays only itself - and the buffer is bounded, so a slow reader can't cost more than
+that. A stalled tab on bad wifi used to accumulate every message and every state
+snapshot for as long as the room lasted. Now:
+
+  state     coalesced. A snapshot is superseded by the next one, so a reader that is
+            behind only ever has the latest waiting, never a backlog of old boards.
+  message   kept, every one. Skipping somebody's word is not a thing a client can
+  (and the  repair by drawing the next frame.
+  rest)
+
+A reader that still falls `LIMIT` frames behind is cut loose: its buffer is cleared and
+its stream ends. The same rule is what finally collects a subscriber that went away
+without unsubscribing - it stops being a leak the moment it stops keeping up.
+
+**Resuming.** Every frame carries an SSE `id` - the topic's epoch and a counter - and
+each topic keeps the last `REPLAY` messages plus its latest state. A browser that
+reconnects sends the last id it saw as `Last-Event-ID`, and if everything after it is
+still held it gets exactly that, and nothing else. A dropped connection used to cost
+every message said in the gap, and the client made up for it by refetching the room
+and its whole log; after a blip that hit everyone at once, that was a full room dump
+per client. When the gap is too old to replay (or from another incarnation of the room,
+which is what the epoch is for) the client is sent the current state and a `resync`
+telling it to reload - the same thing it used to do every time, now only when it must.
 """
 
+import json
 import queue
 import threading
+import uuid
+from collections import deque
+
+from . import metrics
+
+#: Frames a subscriber may have waiting before it is judged too slow to keep. A busy
+#: room produces a few per move, so this is minutes of backlog, not seconds.
+LIMIT = 256
+
+#: Messages each topic keeps for replay. Twice `LIMIT`, so a subscriber that was cut
+#: loose for falling behind can usually still resume rather than reload. Messages are a
+#: few hundred bytes each; state is kept once, not per frame.
+REPLAY = 2 * LIMIT
+
+#: Kinds where only the latest matters.
+COALESCED = {"state"}
+
+#: Kinds that mean nothing after the fact, so they are never replayed. "The bot is
+#: thinking" replayed after the bot has answered would be a lie.
+EPHEMERAL = {"thinking"}
+
+_EVICTED = metrics.counter("bus_subscribers_evicted",
+                           "subscribers cut loose for falling too far behind")
+_COALESCED = metrics.counter("bus_states_coalesced",
+                             "state frames replaced by a newer one before being read")
+_REPLAYED = metrics.counter("bus_frames_replayed",
+                            "frames sent again to a subscriber resuming with Last-Event-ID")
+_RESYNCS = metrics.counter("bus_resyncs",
+                           "reconnects that could not be replayed and had to reload")
+
+
+def frame(kind, data, event_id=None):
+    """One server-sent event, ready to write to the wire."""
+    body = f"event: {kind}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+    return _stamp(event_id, body) if event_id else body
+
+
+def _stamp(event_id, body):
+    return b"id: " + event_id.encode("ascii") + b"\n" + body
+
+
+#: A comment line. Keeps an idle connection from being dropped by something in the middle.
+PING = b": ping\n\n"
+
+#: The last thing an evicted subscriber hears. `retry` is how long the browser waits
+#: before reconnecting, at which point it resumes from its last id or is told to resync.
+EVICTED = b"retry: 1000\n: fell behind\n\n"
+
+#: Sent to a reconnecting client whose gap can't be replayed.
+RESYNC = frame("resync", {"reason": "missed too much - reload the room"})
+
+
+class Subscription:
+    """One listener's buffer. Written by `Bus.publish`, read by one SSE generator.
+
+    `resumed` and `cursor` are set by `Bus.subscribe`: whether the backlog since the
+    client's Last-Event-ID was replayed into the buffer, and the id of the last frame
+    published before this subscription began. `last_id` is the id of the last frame
+    the client has been handed, which is where it will resume from.
+    """
+
+    def __init__(self, limit=LIMIT):
+        self._frames = deque()                  # (kind, encoded, event id)
+        self._limit = limit
+        self._cond = threading.Condition()
+        self.evicted = False
+        self.resumed = False
+        self.cursor = None
+        self.last_id = None
+
+    def put(self, kind, encoded, event_id=None):
+        """Queue a frame. False means this subscriber has just been cut loose."""
+        with self._cond:
+            if self.evicted:
+                return False
+            if kind in COALESCED:
+                stale = next((f for f in self._frames if f[0] == kind), None)
+                if stale is not None:
+                    self._frames.remove(stale)
+                    _COALESCED.inc()
+            elif len(self._frames) >= self._limit:
+                self._frames.clear()
+                # With the last id it was given, so the browser's Last-Event-ID is
+                # one this stream set rather than whatever it last happened to hold.
+                parting = _stamp(self.last_id, EVICTED) if self.last_id else EVICTED
+                self._frames.append(("evicted", parting, None))
+                self.evicted = True
+                self._cond.notify()
+                _EVICTED.inc()
+                return False
+            self._frames.append((kind, encoded, event_id))
+            self._cond.notify()
+            return True
+
+    def replay(self, frames):
+        """Queue a resumed client's backlog, `(kind, encoded, event id)` oldest first.
+
+        Not through `put`: a client is only ever evicted `LIMIT` frames behind, so the
+        gap it comes back with is at least that long, and holding it to the limit would
+        evict it again during its own replay - every reconnect, until the ring had
+        dropped its id. The backlog is let in whole and the limit raised by its length,
+        so what it may fall behind by from here is still `LIMIT`. `since` has already
+        kept only the latest of each coalesced kind.
+        """
+        with self._cond:
+            self._frames.extend(frames)
+            self._limit += len(frames)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """The next frame, as bytes. Raises `queue.Empty` if none arrives in time."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames, timeout):
+                raise queue.Empty
+            _, encoded, event_id = self._frames.popleft()
+            if event_id:
+                self.last_id = event_id
+            return encoded
+
+    @property
+    def finished(self):
+        """Evicted, and the parting frame has been read. Nothing more will arrive."""
+        with self._cond:
+            return self.evicted and not self._frames
+
+    def __len__(self):
+        with self._cond:
+            return len(self._frames)
+
+
+class _Topic:
+    """One room's listeners, its counter, and what it keeps for replay.
+
+    Outlives its listeners on purpose: the moment nobody is connected is exactly the
+    gap a reconnecting client needs replayed. It goes when the room does (`Bus.drop`).
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.listeners = set()
+        self.ring = deque()                     # (seq, kind, encoded), oldest first
+        self.latest = {}                        # coalesced kind -> (seq, encoded)
+        self.lost_through = 0                   # highest seq that fell off the ring
+        self.dropped = False
+        self.lock = threading.Lock()            # orders ids with delivery
+
+    def event_id(self, seq=None):
+        return f"{self.epoch}.{self.seq if seq is None else seq}"
+
+    def keep(self, seq, kind, encoded):
+        if kind in EPHEMERAL:
+            return
+        if kind in COALESCED:
+            self.latest[kind] = (seq, encoded)
+            return
+        if len(self.ring) >= REPLAY:
+            self.lost_through = self.ring.popleft()[0]
+        self.ring.append((seq, kind, encoded))
+
+    def since(self, last_event_id):
+        """Every kept frame after `last_event_id`, in order - or None if any are gone."""
+        epoch, _, n = (last_event_id or "").partition(".")
+        try:
+            n = int(n)
+        except ValueError:
+            return None
+        if epoch != self.epoch or n < self.lost_through or n > self.seq:
+            return None
+        missed = [(s, k, e) for s, k, e in self.ring if s > n]
+        missed += [(s, k, e) for k, (s, e) in self.latest.items() if s > n]
+        return sorted(missed, key=lambda f: f[0])
 
 
 class Bus:
     def __init__(self):
-        self._topics = {}                       # topic -> {queue}
+        self._topics = {}                       # topic -> _Topic
         self._lock = threading.Lock()
 
-    def subscribe(self, topic):
-        q = queue.Queue()
+    def _topic(self, topic):
         with self._lock:
-            self._topics.setdefault(topic, set()).add(q)
-        return q
+            t = self._topics.get(topic)
+            # A dropped topic belongs to a room that is gone. A new room under the same
+            # id starts a new epoch, so no id from the old one can resume into it.
+            if t is None or t.dropped:
+                t = self._topics[topic] = _Topic()
+            return t
 
-    def unsubscribe(self, topic, q):
+    def subscribe(self, topic, last_event_id=None):
+        """A new subscription, resumed from `last_event_id` if that is still possible."""
+        sub = Subscription()
+        t = self._topic(topic)
+        with t.lock:
+            if last_event_id:
+                missed = t.since(last_event_id)
+                if missed is None:
+                    _RESYNCS.inc()
+                else:
+                    sub.replay([(kind, encoded, t.event_id(seq))
+                                for seq, kind, encoded in missed])
+                    sub.resumed = True
+                    sub.last_id = last_event_id
+                    _REPLAYED.inc(len(missed))
+            sub.cursor = t.event_id()
+            if not sub.resumed:
+                sub.last_id = sub.cursor
+            t.listeners.add(sub)
+        return sub
+
+    def unsubscribe(self, topic, sub):
         with self._lock:
-            listeners = self._topics.get(topic)
-            if listeners:
-                listeners.discard(q)
-                if not listeners:
+            t = self._topics.get(topic)
+        if t is None:
+            return
+        with t.lock:
+            t.listeners.discard(sub)
+            gone = t.dropped and not t.listeners
+        if gone:
+            with self._lock:
+                if self._topics.get(topic) is t:
                     del self._topics[topic]
 
     def publish(self, topic, kind, data):
-        """Hand `(kind, data)` to everyone on this topic.
+        """Hand `(kind, data)` to everyone on this topic, as one encoded frame.
 
-        The set is copied under the lock and written to outside it: publishing happens
-        on a turn's worker thread, and holding the lock across the puts would make one
-        room's fan-out block every other room's subscribe.
+        The JSON is encoded before any lock is taken. The id is stamped and the frame
+        delivered under the topic's own lock, so ids reach every subscriber in the order
+        they were issued - a client must never see 7 before 6, or a resume from 7 would
+        silently skip 6. Delivery is a non-blocking append per listener, and the lock is
+        this room's alone, so one room's fan-out never holds up another's.
         """
+        body = frame(kind, data)
+        t = self._topic(topic)
+        evicted = []
+        with t.lock:
+            t.seq += 1
+            event_id = t.event_id()
+            encoded = _stamp(event_id, body)
+            t.keep(t.seq, kind, encoded)
+            for sub in list(t.listeners):
+                if not sub.put(kind, encoded, event_id):
+                    evicted.append(sub)
+        for sub in evicted:
+            self.unsubscribe(topic, sub)
+
+    def drop(self, topic):
+        """The room is gone: forget its counter and replay, once nobody is listening."""
         with self._lock:
-            listeners = list(self._topics.get(topic, ()))
-        for q in listeners:
-            q.put((kind, data))
+            t = self._topics.get(topic)
+            if t is None:
+                return
+            with t.lock:
+                if t.listeners:
+                    t.dropped = True
+                else:
+                    del self._topics[topic]
 
     def listeners(self, topic):
         with self._lock:
-            return len(self._topics.get(topic, ()))
+            t = self._topics.get(topic)
+        return len(t.listeners) if t else 0
+
+    def topics(self):
+        with self._lock:
+            return len(self._topics)
+
+    def subscribers(self):
+        """Everyone listening, across every topic - one per open room stream."""
+        with self._lock:
+            topics = list(self._topics.values())
+        return sum(len(t.listeners) for t in topics)
 
 
 BUS = Bus()
+
+metrics.gauge("bus_topics", "rooms the bus is holding a counter and replay for",
+              fn=BUS.topics)
+metrics.gauge("bus_subscribers", "subscriptions open across every room", fn=BUS.subscribers)
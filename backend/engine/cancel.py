@@ -0,0 +1,105 @@
+"""Giving up on a turn nobody is waiting for any more.
+
+Two ways a turn outlives its audience. In a room the bot's answer is about the board as
+it was when the question went out; if the bot is switched off, everyone leaves or the
+rules change while the model is still writing, that answer will be thrown away when it
+arrives. Solo, the browser can close the `/stream` response mid-turn. Either way the
+model used to carry on to the last token, and a worker sat waiting for it.
+
+A `Token` is handed to the turn when it starts and cancelled by whatever makes it
+pointless. The turn notices at its next event and raises `Cancelled`, which closes the
+provider's stream - and closing a streamed HTTP response mid-generation is what actually
+stops the model spending tokens on it.
+
+`Cancelled` is a BaseException on purpose, like asyncio's: abandoning a turn is not an
+error, and the engine's many `except Exception` handlers - each of which turns a failure
+into a "?" bubble and a recorded turn - must not catch it and carry on as though the
+player were still there.
+"""
+
+import threading
+
+from . import metrics
+
+_CANCELLED = metrics.counter("turns_cancelled",
+                             "model-backed turns abandoned before the model finished")
+_SAVED = metrics.counter("tokens_saved_estimate",
+                         "output tokens not generated because a turn was abandoned")
+
+#: Characters per token, for turning text into an estimate. Rough, and only ever used to
+#: size a saving, never to bill anything.
+_CHARS_PER_TOKEN = 4
+
+
+class Cancelled(BaseException):
+    """The turn was abandoned. Not an error - nobody is waiting for the answer."""
+
+
+class Token:
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def sleep(self, seconds):
+        """time.sleep, but cut short by `cancel` - which then raises Cancelled."""
+        self._event.wait(max(seconds, 0))
+        self.check()
+
+
+class _Typical:
+    """How much a finished turn usually writes, so an abandoned one can be sized.
+
+    A running average of the finished move's size rather than `max_tokens`: a turn is
+    a few dozen tokens of JSON against a ceiling of thousands, and counting the ceiling
+    as saved would make every cancellation look like a fortune. Thinking tokens never
+    reach this, so the estimate is a floor.
+    """
+
+    def __init__(self):
+        self.chars = 0.0
+
+    def learn(self, data):
+        size = len(str(data))
+        self.chars = size if not self.chars else 0.9 * self.chars + 0.1 * size
+
+
+_TYPICAL = _Typical()
+
+
+def guard(events, token):
+    """Pass a provider's stream through, stopping it the moment `token` is cancelled.
+
+    Checked between events, so a provider that checks the same token itself (see
+    `TurnContext.cancel`) can stop sooner, while it is still thinking and has nothing
+    to yield.
+    """
+    seen = 0
+    try:
+        for kind, payload in events:
+            token.check()
+            if kind == "done":
+                _TYPICAL.learn(payload)
+            else:
+                seen += len(str(payload))
+            yield kind, payload
+    except Cancelled:
+        _CANCELLED.inc()
+        _SAVED.inc(int(max(0.0, _TYPICAL.chars - seen) / _CHARS_PER_TOKEN))
+        raise
+    finally:
+        close = getattr(events, "close", None)
+        if close:
+            close()
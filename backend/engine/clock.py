@@ -0,0 +1,123 @@
+"""One thread for every room's clock.
+
+A room's countdown restarts on every turn advance, every join, every message with the
+bot off - and it used to do that with a fresh `threading.Timer`, which is a whole OS
+thread that sleeps for twenty seconds and is then usually cancelled. Two hundred busy
+rooms meant hundreds of short-lived threads a minute, all competing with the 32 that
+actually serve requests.
+
+So there is one scheduler. Deadlines go on a heap; the thread sleeps until the earliest
+one, or until something earlier is armed. Arming is a push, O(log n). Cancelling marks
+the entry dead and leaves it where it is, O(1) - popping it from the middle of a heap
+would cost more than skipping it when it comes up - and the heap is rebuilt without
+the dead entries once they outnumber the live ones, so a room re-armed every few
+seconds for an hour can't grow it without bound.
+
+Callbacks run on the scheduler thread, one after another. That is fine for what runs
+here - a room's expiry takes the room's lock, posts a line and maybe wakes the bot on
+a worker, all of it quick - and it is the reason a callback must not block: while one
+runs, every other room's clock waits behind it. An exception in one is logged and
+dropped rather than taking the thread down with it.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+
+class Handle:
+    """What `call_later` returns. `cancel()` is safe to call any number of times, from
+    any thread, including after the callback has run."""
+
+    __slots__ = ("when", "fn", "args", "cancelled", "_scheduler")
+
+    def __init__(self, when, fn, args, scheduler):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    def cancel(self):
+        self._scheduler._cancel(self)
+
+
+class Scheduler:
+    def __init__(self, name="clock"):
+        self._name = name
+        self._heap = []                         # (when, tiebreak, Handle)
+        self._order = itertools.count()
+        self._dead = 0                          # cancelled entries still in the heap
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay, fn, *args):
+        """Run `fn(*args)` on the scheduler thread in `delay` seconds."""
+        handle = Handle(time.monotonic() + delay, fn, args, self)
+        with self._cond:
+            heapq.heappush(self._heap, (handle.when, next(self._order), handle))
+            if self._heap[0][2] is handle:
+                self._cond.notify()             # earlier than what it was sleeping on
+            self._start()
+        return handle
+
+    def pending(self):
+        """Live timers, not counting the cancelled ones still waiting to be skipped."""
+        with self._cond:
+            return len(self._heap) - self._dead
+
+    def _cancel(self, handle):
+        with self._cond:
+            if handle.cancelled:
+                return
+            handle.cancelled = True
+            self._dead += 1
+            if self._dead > 64 and self._dead * 2 > len(self._heap):
+                self._heap = [e for e in self._heap if not e[2].cancelled]
+                heapq.heapify(self._heap)
+                self._dead = 0
+
+    def _start(self):
+        # Caller holds the condition.
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self._name,
+                                            daemon=True)
+            self._thread.start()
+
+    def _next_due(self):
+        """Block until an entry is due, and take it off the heap."""
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                    self._dead -= 1
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait <= 0:
+                    handle = heapq.heappop(self._heap)[2]
+                    # Marked so a late cancel() doesn't count it as dead in the heap.
+                    handle.cancelled = True
+                    return handle
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            handle = self._next_due()
+            try:
+                handle.fn(*handle.args)
+            except Exception:                               # noqa: BLE001
+                log.exception("scheduled callback %r failed", handle.fn)
+
+
+SCHEDULER = Scheduler()
+
+metrics.gauge("clock_timers_pending", "room clocks armed and not yet fired",
+              fn=SCHEDULER.pending)
@@ -22,6 +22,13 @@ Swapping the brain is a config change, not a code change:
 
   # No network at all - deterministic stub, for tests and offline dev.
   RTS_PROVIDER=stub
+
+  # No network, but a model's pace - the stub played slowly, for load tests.
+  RTS_PROVIDER=sim
+  RTS_SIM_TTFT_MS=600
+  RTS_SIM_TAIL_RATE=0.05        # and a bad day: slow tail, some errors, some bad moves
+  RTS_SIM_ERROR_RATE=0.01
+  RTS_SIM_ILLEGAL_RATE=0.1
 """
 
 import os
@@ -60,3 +67,95 @@ THINKING = (os.environ.get("RTS_THINKING") or "adaptive").strip() or None
 # (a justification that turns on something the model cannot know), just not worth
 # offering on a turn that is one word answering one word.
 SEARCH = int(os.environ.get("RTS_SEARCH", "0"))
+
+# Model-backed turns allowed out at once, across every room and every streamed solo turn.
+# Past this they queue, earliest deadline first (see workers.py). Sized against the 32
+# request threads in the Procfile: enough that a quiet spell never queues, few enough
+# that a burst can't spend every thread the server has waiting on a model.
+MODEL_WORKERS = int(os.environ.get("RTS_MODEL_WORKERS", "12"))
+
+# Re-read prompts/*.md when they change on disk. On by default on a laptop, where editing
+# a prompt and playing the next turn is the whole workflow; off by default when hosted,
+# where the files can't change and checking would cost a stat per file per turn. Hosted
+# is detected the same way transcript.py does it - Cloud Run, App Engine, or a project.
+_HOSTED = bool(os.environ.get("K_SERVICE") or os.environ.get("GAE_ENV")
+               or os.environ.get("GOOGLE_CLOUD_PROJECT"))
+PROMPT_RELOAD = os.environ.get("RTS_PROMPT_RELOAD", "0" if _HOSTED else "1").strip() == "1"
+
+# Kept-alive connections per host for providers that make their own HTTP calls (see
+# providers/connections.py). Defaults to MODEL_WORKERS, so every worker can have one and
+# none ever waits on another's; lower it for a local server that can only answer one
+# request at a time anyway.
+HTTP_POOL = int(os.environ.get("RTS_HTTP_POOL", str(MODEL_WORKERS)))
+
+# Where the OpenAI-compatible provider remembers which response_format each endpoint
+# accepts, across restarts. Empty (the default) keeps it in memory only - one probe per
+# process. See openai_provider._Formats.
+FORMAT_CACHE = os.environ.get("RTS_FORMAT_CACHE", "").strip()
+
+# How long a learned response_format fallback is trusted before the strict form is tried
+# again. A day: a server that really can't do json_schema costs one refused request a
+# day, and one that has been upgraded - or only refused because of an unrelated bad
+# request - gets its stricter rung back by tomorrow.
+FORMAT_TTL_S = float(os.environ.get("RTS_FORMAT_TTL_S", "86400"))
+
+# Ask for a few ranked backup words alongside every move (schema.py, "candidates"). When
+# the model's word turns out to be illegal or already played, the first backup that
+# passes is played instead of sending the whole turn back for another try. Off by
+# default: it adds a handful of output tokens to every turn to save a round-trip on the
+# few that need one, which is only a good trade on crowded boards.
+CANDIDATES = os.environ.get("RTS_CANDIDATES", "0").strip() == "1"
+
+# Outcomes worded from a phrase bank instead of by the model (see phrases.py) - a comma-
+# separated list of rule_break, repeat and timeout, or "all". These are turns the engine
+# has already decided, where the model only phrases the loss; naming one here trades its
+# wording for an instant answer and no tokens. Empty (the default) asks the model.
+PHRASES = frozenset(
+    p.strip().lower() for p in os.environ.get("RTS_PHRASES", "").split(",") if p.strip()
+)
+
+# Write the next turn's prompt prefix to the provider's cache right after the bot moves,
+# while the player is still thinking (prewarm.py). Off by default - each prewarm is a
+# real, if tiny, request. PREWARM_EVERY_S is the least time between two for one game:
+# the cache lasts five minutes and a warm session keeps itself warm, so more often than
+# that buys nothing.
+PREWARM = os.environ.get("RTS_PREWARM", "0").strip() == "1"
+PREWARM_EVERY_S = float(os.environ.get("RTS_PREWARM_EVERY_S", "240"))
+
+# The sampling profiler behind /profile (profiler.py), which only runs while somebody
+# has asked it to. PROFILE_HZ is how often it samples every tagged thread's stack; 100 is
+# fine-grained enough to see a FieldReader feed and cheap enough to run on the live
+# service. PROFILE_MAX_S caps how long one request may run it for.
+PROFILE_HZ = int(os.environ.get("RTS_PROFILE_HZ", "100"))
+PROFILE_MAX_S = float(os.environ.get("RTS_PROFILE_MAX_S", "60"))
+
+# The simulated provider (providers/sim_provider.py): how long before its first token,
+# and how fast the rest arrive. The defaults are a fast hosted model on a short reply -
+# a turn of about a second - so a load test run on them is not flattering the server.
+# SIM_TOKENS_PER_S=0 sends the whole reply straight after the first token, unpaced.
+SIM_TTFT_MS = float(os.environ.get("RTS_SIM_TTFT_MS", "600"))
+SIM_TOKENS_PER_S = float(os.environ.get("RTS_SIM_TOKENS_PER_S", "60"))
+
+# How uneven the simulated provider is, so a run can look like the service on a bad day
+# rather than a metronome. SIM_JITTER is the spread of every call's pace (the sigma of a
+# lognormal around the two numbers above; 0 is exact). SIM_TAIL_RATE of calls are then
+# SIM_TAIL_X times slower again - the queueing stall a real provider's p99 is made of,
+# which no amount of jitter reproduces.
+SIM_JITTER = float(os.environ.get("RTS_SIM_JITTER", "0.2"))
+SIM_TAIL_RATE = float(os.environ.get("RTS_SIM_TAIL_RATE", "0.02"))
+SIM_TAIL_X = float(os.environ.get("RTS_SIM_TAIL_X", "5"))
+
+# ...and how unreliable. SIM_ERROR_RATE of calls fail partway, as a 5xx or a dropped
+# stream does; SIM_TIMEOUT_RATE hang without a first token for SIM_TIMEOUT_S and then
+# raise TimeoutError, as the real providers' 60s read timeout does. SIM_ILLEGAL_RATE of
+# moves play a word that breaks the rule or was already played, which is what sends a
+# turn round for its retry. All three default to 0: a load test measures the happy path
+# unless it is asked not to.
+SIM_ERROR_RATE = float(os.environ.get("RTS_SIM_ERROR_RATE", "0"))
+SIM_TIMEOUT_RATE = float(os.environ.get("RTS_SIM_TIMEOUT_RATE", "0"))
+SIM_TIMEOUT_S = float(os.environ.get("RTS_SIM_TIMEOUT_S", "60"))
+SIM_ILLEGAL_RATE = float(os.environ.get("RTS_SIM_ILLEGAL_RATE", "0"))
+
+# Seeds the simulated provider's dice, so a run that turned something up can be run
+# again the same way. Empty is a different run every time.
+SIM_SEED = os.environ.get("RTS_SIM_SEED", "").strip() or None
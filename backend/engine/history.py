@@ -109,6 +109,10 @@ class History:
         # Showing it what it actually said works where the instruction didn't.
         self.asks = []
 
+        # Lines worded by phrases.py rather than the model, for the same reason: each
+        # new one is steered away from the last few.
+        self.phrased = []
+
     def record(self, kind, player, word=None, reason=None):
         self.events.append(Event(kind, player, word, reason))
 
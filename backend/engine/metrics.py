@@ -0,0 +1,203 @@
+"""Numbers about the process itself, kept in memory.
+
+The transcript says what was played; this says how the machinery behind it is coping -
+how deep a queue is, how many rows were dropped, how long a write took. Nothing here is
+durable and nothing needs to be: it describes the process that is running now, and a
+restart is a new process with new numbers.
+
+Dependency-free on purpose. Three shapes cover everything worth watching:
+
+  Counter     only goes up. Things that happened: rows dropped, turns cancelled.
+  Gauge       goes either way, or is read from a function at the moment it is asked
+              for. Things that are: queue depth, rooms open.
+  Histogram   fixed buckets, plus a count and a sum. How long things took.
+
+Metrics are created once, at import time of whichever module owns them, and registered
+by name - asking for the same name twice returns the same metric, so a module reloaded
+in dev doesn't end up with two counters for one thing. It is also how two modules share
+one: both providers count into the same `model_calls_inflight`.
+
+`render` writes the lot in Prometheus's text format, which is what server.py's /metrics
+serves. Names are the registered ones under an `rts_` prefix; no labels, because
+nothing here has needed more than a name to say what it counts.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+#: Latency buckets, in milliseconds. Wide on purpose: a local write is a millisecond and
+#: a model call with search on is tens of seconds, and both are measured with these.
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self._value += n
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help="", fn=None):
+        self.name = name
+        self.help = help
+        self._fn = fn
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, n=1):
+        with self._lock:
+            self._value += n
+
+    def dec(self, n=1):
+        self.inc(-n)
+
+    @contextmanager
+    def track(self):
+        """Up by one for as long as the block runs. Things in progress: open streams."""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    @property
+    def value(self):
+        if self._fn is not None:
+            try:
+                return self._fn()
+            except Exception:                               # noqa: BLE001
+                return None
+        return self._value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=MS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)   # the last one is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe how long the block took, in ms - whether or not it raised."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe((time.monotonic() - started) * 1000)
+
+    @property
+    def value(self):
+        """Cumulative counts per upper bound, the way they are usually read."""
+        with self._lock:
+            counts, total, n = list(self._counts), self._sum, self._count
+        running, cumulative = 0, {}
+        for bound, c in zip((*self.buckets, "+Inf"), counts):
+            running += c
+            cumulative[str(bound)] = running
+        return {"count": n, "sum": round(total, 3), "buckets": cumulative}
+
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _register(cls, name, *args, **kwargs):
+    with _lock:
+        existing = _metrics.get(name)
+        if existing is None:
+            existing = _metrics[name] = cls(name, *args, **kwargs)
+        return existing
+
+
+def counter(name, help=""):
+    return _register(Counter, name, help)
+
+
+def gauge(name, help="", fn=None):
+    return _register(Gauge, name, help, fn=fn)
+
+
+def histogram(name, help="", buckets=MS_BUCKETS):
+    return _register(Histogram, name, help, buckets=buckets)
+
+
+def snapshot(prefix=""):
+    """{name: value} for every metric whose name starts with `prefix`."""
+    with _lock:
+        chosen = [m for name, m in sorted(_metrics.items()) if name.startswith(prefix)]
+    return {m.name: m.value for m in chosen}
+
+
+#: Put in front of every name `render` writes, so ours can't collide with anyone's.
+PREFIX = "rts_"
+
+
+def render():
+    """Every metric in Prometheus's text exposition format (version 0.0.4).
+
+    A gauge whose function fails is left out rather than written as a guess; a scraper
+    reads a missing series as missing, and a zero as a fact.
+    """
+    with _lock:
+        chosen = [m for _, m in sorted(_metrics.items())]
+    lines = []
+    for m in chosen:
+        value = m.value
+        if value is None:
+            continue
+        name = PREFIX + m.name
+        if m.help:
+            lines.append(f"# HELP {name} {_escape(m.help)}")
+        lines.append(f"# TYPE {name} {m.kind}")
+        if m.kind == "histogram":
+            for bound, n in value["buckets"].items():
+                lines.append(f'{name}_bucket{{le="{bound}"}} {n}')
+            lines.append(f"{name}_sum {_number(value['sum'])}")
+            lines.append(f"{name}_count {value['count']}")
+        else:
+            lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _number(value):
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(int(value)) if value.is_integer() else repr(value)
@@ -0,0 +1,109 @@
+"""Lines for outcomes the engine has already decided, written without the model.
+
+A rule break, a replayed word and a silent clock all end the round on the engine's
+say-so; the model is only ever asked how to put it. That is a whole prompt of input and
+a second or two of generation for one line - on the turn where the player has just lost
+and is least inclined to wait. Rooms have always done this deterministically
+(roomturn._resolve); this lets solo play do the same, per outcome, when
+`config.PHRASES` asks for it.
+
+The model's wording is better, which is why it stays the default. What it does that a
+template can't is vary; so this varies by construction. A line is three parts - what
+happened, whose round it is, the offer of another game - each drawn from its own list,
+and a part that appears in one of the last few lines said is passed over while there's
+another to use. That is the same lesson as `History.asks`: told to vary, a writer (model
+or template) repeats itself with a word swapped; shown what it just said, it doesn't.
+
+Everything here says who won in both directions - "that round's mine", never "the
+round is yours to lose" - for the reason turn.py gives at length: a reader who doesn't
+already know the answer has to be able to tell.
+"""
+
+import random
+
+from . import config, metrics, rules
+
+#: The outcomes this can word, as named in RTS_PHRASES.
+OUTCOMES = ("rule_break", "repeat", "timeout")
+
+#: How many recent lines a part must not appear in, if it can be helped.
+RECENT = 4
+
+_SERVED = metrics.counter("phrases_served",
+                          "decided outcomes worded from the phrase bank, not the model")
+
+# What happened. {word} is the word played, {letter} its first letter.
+_WHAT = {
+    ("rule_break", False): [
+        "{word} starts with {letter}",
+        "{letter}'s off limits - {word} doesn't count",
+        "{word} - {letter} words don't count",
+        "no {letter} words, and {word} is one",
+    ],
+    ("rule_break", True): [
+        "{word} doesn't start with r, t or s",
+        "only r, t and s words right now - {word} isn't one",
+        "{word} opens with {letter}, not r, t or s",
+        "it's r, t or s only, and {word} starts with {letter}",
+    ],
+    ("repeat", None): [
+        "{word}'s already been played",
+        "{word}? already on the board",
+        "we've had {word} already",
+        "{word} was played earlier",
+    ],
+    ("timeout", None): [
+        "time's up",
+        "clock ran out",
+        "that's time",
+        "out of time there",
+    ],
+}
+
+# Whose round it is. Always the bot's - these are only ever the player's losses.
+_VERDICT = [
+    "that round's mine",
+    "round goes to me",
+    "i'll take that one",
+    "that one's mine",
+    "point to me",
+]
+
+# What next. The board is theirs to open, so this offers rather than plays.
+_OFFER = [
+    "another game?",
+    "go again?",
+    "want another?",
+    "new game?",
+    "again?",
+]
+
+_rng = random.Random()
+
+
+def enabled(outcome):
+    """Is `outcome` worded here rather than by the model? See config.PHRASES."""
+    return outcome in config.PHRASES or "all" in config.PHRASES
+
+
+def line(outcome, history, rule=None, word=""):
+    """One line for `outcome`, unlike the last few, remembered in `history`."""
+    word = (word or "").strip().lower()
+    key = (outcome, rule.reverse if outcome == "rule_break" and rule else None)
+    recent = history.phrased[-RECENT:]
+    what = _pick(_WHAT[key], recent).format(word=word, letter=rules.first_letter(word))
+    said = f"{what}. {_pick(_VERDICT, recent)}. {_pick(_OFFER, recent)}"
+    history.phrased.append(said)
+    _SERVED.inc()
+    return said
+
+
+def _pick(parts, recent):
+    fresh = [p for p in parts if not any(_stem(p) in said for said in recent)]
+    return _rng.choice(fresh or parts)
+
+
+def _stem(part):
+    # The fixed text of a part, for spotting it in a line that has been filled in:
+    # "{word} starts with {letter}" is recognised by " starts with ".
+    return max(part.replace("{letter}", "{word}").split("{word}"), key=len)
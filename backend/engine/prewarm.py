@@ -0,0 +1,104 @@
+"""Filling the prompt cache while the player is still thinking.
+
+The moment the bot has moved, the next turn's prompt is known up to its last message:
+the same system prompt, the same transcript plus the two lines just said, and a turn
+block that can't be known until the player answers. Left alone, that prefix is written
+to the cache by the next turn itself - which is free when the turn before was a hit,
+since it only adds the two new lines, but is the whole prompt at full price and full
+latency on the first turn of a session, and on the first turn after five quiet minutes.
+
+So, opt-in (config.PREWARM), the prefix is written as soon as the bot has moved: the
+real request, with a placeholder where the turn block goes and generation stopped at a
+handful of tokens. It runs on the turn pool with a deadline far enough out that any
+real turn is served first.
+
+Not every time. A turn that read from the cache shows the session is warm and will stay
+so on its own; one prewarm per game per `PREWARM_EVERY_S` is the most that's useful
+against a five-minute cache. What it costs is counted (`prewarm_*_tokens`) beside what it
+buys: time to first token for turns that came after a prewarm and turns that didn't.
+"""
+
+import logging
+import threading
+import time
+
+from . import config, metrics, prompts
+from .providers import get_provider
+from .schema import move_schema
+from .workers import POOL
+
+log = logging.getLogger(__name__)
+
+_SENT = metrics.counter("prewarm_calls", "prompt-cache prewarm requests made")
+_FAILED = metrics.counter("prewarm_failed", "prewarm requests that raised")
+_WARM = metrics.counter("prewarm_skipped_warm",
+                        "prewarms not sent because the turn before read from the cache")
+_RECENT = metrics.counter("prewarm_skipped_recent",
+                          "prewarms not sent because the game had one recently")
+_INPUT = metrics.counter("prewarm_input_tokens",
+                         "input tokens prewarms paid for, cache writes included")
+_OUTPUT = metrics.counter("prewarm_output_tokens", "output tokens prewarms paid for")
+_TTFT_WARMED = metrics.histogram("turn_ttft_ms_prewarmed",
+                                 "ms to the first model event, on turns after a prewarm")
+_TTFT_COLD = metrics.histogram("turn_ttft_ms_unwarmed",
+                               "ms to the first model event, on turns with no prewarm")
+
+_last = {}                  # game or room id -> monotonic time of its last prewarm
+_warmed = set()             # ids prewarmed since their last turn
+_lock = threading.Lock()
+
+
+def after(key, game, usage, room=False, thoughts=True):
+    """The bot has just moved in `key`'s game. Warm the next turn's prefix if it's worth it.
+
+    `usage` is the turn's token tally (TurnContext.count); `room` and `thoughts` pick the
+    system prompt and schema the next turn will ask with, since the cache only matches
+    a request that is the same in both.
+    """
+    if not config.PREWARM:
+        return
+    provider = get_provider()
+    if not provider.caches_prompts:
+        return
+    if usage and usage.get("cache_read"):
+        _WARM.inc()
+        return
+
+    now = time.monotonic()
+    with _lock:
+        if now - _last.get(key, float("-inf")) < config.PREWARM_EVERY_S:
+            _RECENT.inc()
+            return
+        if len(_last) > 4096:
+            stale = now - config.PREWARM_EVERY_S
+            for k in [k for k, t in _last.items() if t < stale]:
+                del _last[k]
+        _last[key] = now
+
+    system = prompts.system_prompt(game.rule, room=room)
+    messages = prompts.prefix(game)
+    schema = move_schema(with_train_of_thought=thoughts)
+    POOL.submit(_send, key, provider, system, messages, schema,
+                deadline=time.time() + config.PREWARM_EVERY_S)
+
+
+def observe(key, ttft_ms):
+    """A turn in `key`'s game got its first model event `ttft_ms` after it started."""
+    with _lock:
+        warmed = key in _warmed
+        _warmed.discard(key)
+    (_TTFT_WARMED if warmed else _TTFT_COLD).observe(ttft_ms)
+
+
+def _send(key, provider, system, messages, schema):
+    try:
+        counts = provider.prewarm(system, messages, schema) or {}
+    except Exception as e:                                  # noqa: BLE001
+        _FAILED.inc()
+        log.warning("prewarm for %s failed: %s", key, e)
+        return
+    _SENT.inc()
+    _INPUT.inc(counts.get("input", 0) + counts.get("cache_write", 0))
+    _OUTPUT.inc(counts.get("output", 0))
+    with _lock:
+        _warmed.add(key)
@@ -0,0 +1,119 @@
+"""Where a slow turn's time went, when it wasn't the model.
+
+spans.py says how long the model took and how long everything else took. When
+"everything else" is the part that moved, the next question is which of our own
+functions it was - prompt assembly, the FieldReader, the duplicate checks, encoding the
+frames - and spans can't say, because nobody put a span there.
+
+This samples instead. For the length of a `/profile` request, and only then, a thread
+wakes `PROFILE_HZ` times a second, reads every thread's current stack out of
+`sys._current_frames()` and counts it. Nothing is instrumented and nothing runs when
+nobody is asking: with the profiler off, the whole cost is `tag`, a dict write at the
+start and end of a request.
+
+Threads tell the samples apart by what they are doing for the game, set with `tag`:
+
+  echo     a /echo request, turn and all
+  stream   a /stream turn, on its pool worker, and the response writing it out
+  bot      a room's bot turn
+  sse      a room event stream, fanning the bus out to one browser
+
+Untagged threads - idle pool workers, the clock, the transcript writer - are left out
+unless asked for: an idle thread's stack is a wait, and a flamegraph of waits buries the
+work it was meant to show.
+
+The output is collapsed stacks, one `tag;frame;frame;... count` line per distinct
+stack, which flamegraph.pl and speedscope both read as they are.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from . import config
+
+TAGS = ("echo", "stream", "bot", "sse")
+
+_tags = {}                      # thread ident -> tag, for threads doing tagged work
+_running = threading.Lock()     # held for as long as one profile is being taken
+
+
+class Busy(Exception):
+    """A profile is already being taken; there is only ever one at a time."""
+
+
+@contextmanager
+def tag(name):
+    """Mark the current thread as doing `name`'s work for as long as the block runs."""
+    ident = threading.get_ident()
+    previous = _tags.get(ident)
+    _tags[ident] = name
+    try:
+        yield
+    finally:
+        if previous is None:
+            _tags.pop(ident, None)
+        else:
+            _tags[ident] = previous
+
+
+def tagged(name, fn):
+    """`fn`, tagged as `name` whichever thread it ends up running on - for the pool."""
+    def run(*args, **kwargs):
+        with tag(name):
+            return fn(*args, **kwargs)
+    return run
+
+
+def profile(seconds, hz=None, only=None, untagged=False):
+    """Sample for `seconds` and return the collapsed stacks as text.
+
+    `only` narrows to one tag; `untagged` includes the threads nobody tagged, under
+    "other". Blocks the caller for the whole run - it is meant to be a request that
+    takes as long as the profile it asked for. Raises Busy if one is already running.
+    """
+    seconds = max(0.0, min(float(seconds), config.PROFILE_MAX_S))
+    hz = max(1, min(int(hz or config.PROFILE_HZ), 1000))
+    if not _running.acquire(blocking=False):
+        raise Busy("a profile is already running")
+    try:
+        counts = _sample(seconds, 1.0 / hz, only, untagged)
+    finally:
+        _running.release()
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def _sample(seconds, interval, only, untagged):
+    me = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    next_at = time.monotonic()
+    while next_at < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            name = _tags.get(ident)
+            if name is None and not untagged:
+                continue
+            name = name or "other"
+            if only and name != only:
+                continue
+            counts[_collapse(name, frame)] += 1
+        # On a schedule rather than a fixed sleep, so a slow pass doesn't stretch the
+        # interval and quietly lower the rate.
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.monotonic()))
+    return counts
+
+
+def _collapse(name, frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", "?")
+        stack.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    stack.append(name)
+    return ";".join(reversed(stack))
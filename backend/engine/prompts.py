@@ -17,13 +17,21 @@ of change, which is what makes it cacheable: identity and rules are fixed for th
 session and sit in `system`, while everything that moves per turn rides at the end of the
 last user message, where it can't invalidate the cached prefix.
 
-Files are read on every call so edits during local dev take effect on the next turn
-without a restart. They're small; the cost is nothing.
+The rendered system prompt is cached, one string per (letter rule, room or solo) - four
+in all, built at startup by `preload` so the first turn pays nothing. It used to be read
+and joined from disk on every model call, retries included: a stat and a read per file,
+per call, under load, and a chance of a byte-different prefix - which is a cache miss at
+the provider - if a file happened to be mid-edit. With `config.PROMPT_RELOAD` on (the
+default locally) a cached prompt is rebuilt when any of its files' mtimes move, so an
+edit still takes effect on the next turn without a restart. With it off (the default
+when hosted) nothing is read after startup.
 """
 
+import threading
 from pathlib import Path
 
-from . import history, reading
+from . import config, history, reading
+from .rules import LetterRule
 
 _DIR = Path(__file__).parent / "prompts"
 
@@ -31,23 +39,53 @@ _DIR = Path(__file__).parent / "prompts"
 _LAYERS = ("identity.md", "game.md", "judging.md", "language.md", "conversation.md")
 
 
+_cache = {}                     # (reverse, room) -> (mtimes, rendered)
+_cache_lock = threading.Lock()
+
+
 def _read(name):
     return (_DIR / name).read_text(encoding="utf-8").strip()
 
 
+def _files(reverse, room):
+    rule_file = "letter_rule.reverse.md" if reverse else "letter_rule.normal.md"
+    return (rule_file,) + _LAYERS + (("room.md",) if room else ())
+
+
+def _mtimes(files):
+    return tuple((_DIR / name).stat().st_mtime_ns for name in files)
+
+
 def system_prompt(rule, room=False):
     """The full system prompt, with the active letter rule spliced in.
 
     Stable for the whole session - nothing per-turn belongs in here. The room layer is
     appended rather than interleaved so that solo play's prefix is byte-identical to
     what it was, and a room's prefix is stable for as long as the room lasts. Either
-    way the cache sees one fixed string.
+    way the cache sees one fixed string - and now so does this module's own cache.
     """
-    rule_block = _read("letter_rule.reverse.md" if rule.reverse else "letter_rule.normal.md")
-    layers = _LAYERS + (("room.md",) if room else ())
-    return "\n\n".join(_read(name) for name in layers).replace(
-        "{{LETTER_RULE}}", rule_block
-    )
+    key = (bool(rule.reverse), bool(room))
+    hit = _cache.get(key)
+    if hit is not None and not config.PROMPT_RELOAD:
+        return hit[1]
+
+    files = _files(*key)
+    stamp = _mtimes(files)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+
+    rule_block, *layers = (_read(name) for name in files)
+    rendered = "\n\n".join(layers).replace("{{LETTER_RULE}}", rule_block)
+    with _cache_lock:
+        _cache[key] = (stamp, rendered)
+    return rendered
+
+
+def preload():
+    """Render every variant now, so no turn is the one that reads the files."""
+    for reverse in (False, True):
+        for room in (False, True):
+            system_prompt(LetterRule(reverse), room)
 
 
 def messages(game, player_input, correction=None, preferences=None, room=None):
@@ -62,7 +100,7 @@ def messages(game, player_input, correction=None, preferences=None, room=None):
     every turn, so in the prefix it would invalidate the cache on every request, and it
     belongs next to the message it describes anyway.
     """
-    out = [{"role": role, "content": text} for role, text in game.transcript]
+    out = prefix(game)
     out.append({
         "role": "user",
         "content": _turn_block(game, player_input, correction, preferences, room),
@@ -70,6 +108,12 @@ def messages(game, player_input, correction=None, preferences=None, room=None):
     return out
 
 
+def prefix(game):
+    """Everything `messages` sends ahead of the turn block - the part a prompt cache can
+    hold from one turn to the next (see prewarm.py)."""
+    return [{"role": role, "content": text} for role, text in game.transcript]
+
+
 def _turn_block(game, player_input, correction=None, preferences=None, room=None):
     lines = []
 
@@ -8,12 +8,14 @@ from .. import config
 from .anthropic_provider import AnthropicProvider
 from .base import Provider, TurnContext
 from .openai_provider import OpenAIProvider
+from .sim_provider import SimProvider
 from .stub_provider import StubProvider
 
 _REGISTRY = {
     "anthropic": AnthropicProvider,
     "openai": OpenAIProvider,
     "stub": StubProvider,
+    "sim": SimProvider,
 }
 
 _cached = None
@@ -1,11 +1,12 @@
 """Anthropic brain - a single structured-output call per turn."""
 
 import json
+import logging
 
-from .. import config
+from .. import config, metrics
 from ..schema import MOVE_SCHEMA
 from ..streaming import FieldReader
-from .base import Provider
+from .base import Provider, calling
 
 # Only these are forwarded out of the scanner. With web search on, the model narrates
 # around the results in its own text blocks, and an allowlist keeps a stray quoted
@@ -15,9 +16,24 @@ _FIELDS = ("response_code", "their_word", "chosen_word", "response")
 # A paused turn should resume in one hop; more than a couple means something is wrong.
 _MAX_RESUMES = 3
 
+# A prewarm only has to get as far as writing the cache. Whatever it generates is thrown
+# away, so it is stopped almost at once.
+_PREWARM_TOKENS = 16
+_PREWARM_TURN = {"role": "user", "content": "(nothing yet - waiting for their move)"}
+
+log = logging.getLogger(__name__)
+
+_CACHE_READ = metrics.counter("anthropic_cache_read_tokens",
+                              "input tokens served from the prompt cache")
+_CACHE_WRITTEN = metrics.counter("anthropic_cache_write_tokens",
+                                 "input tokens written to the prompt cache")
+_UNCACHED = metrics.counter("anthropic_uncached_input_tokens",
+                            "input tokens neither read from nor written to the cache")
+
 
 class AnthropicProvider(Provider):
     name = "anthropic"
+    caches_prompts = True
 
     def __init__(self, model=None, max_tokens=None, effort=None, thinking=None,
                  search=None):
@@ -50,17 +66,30 @@ class AnthropicProvider(Provider):
             "system": [{
                 "type": "text",
                 "text": system_prompt,
+                # The system prompt is fixed for a session and the transcript only ever
+                # grows at the end, so everything up to here is a stable prefix. Sonnet 5
+                # caches from 1024 tokens; the layered prompt clears that comfortably.
                 "cache_control": {"type": "ephemeral"},
             }],
             "output_config": output_config,
-            "messages": messages,
+            "messages": _with_breakpoint(messages),
         }
+
+        # Runs on Anthropic's side, so there's no execution loop to write - but it does
+        # cost seconds, and someone is watching a typing indicator. The prompt is what
+        # keeps it rare: it's for justifications that turn on something the model has no
+        # way to know, not for looking up whether two ordinary words are related.
         if self.search:
             request["tools"] = [{
                 "type": "web_search_20260209",
                 "name": "web_search",
                 "max_uses": self.search,
             }]
+        # Judging whether two words are related is the one genuinely hard call in a turn,
+        # and it was being made with reasoning switched off. Leave thinking on unless a
+        # model is configured that can't do it - and note that disabling it on Sonnet 5
+        # or Opus 5 also risks a tool call arriving as plain text, which would silently
+        # never run.
         if self.thinking:
             request["thinking"] = {"type": self.thinking}
         return request
@@ -73,85 +102,138 @@ class AnthropicProvider(Provider):
         and a single scanner spanning all of them would read that prose as part of the
         JSON. The last block that parses is the move, which is the same rule the
         non-streaming path uses.
+
+        `ctx.cancel` is checked on every raw event, thinking included, so an abandoned
+        turn stops mid-thought rather than at its first text. Raising inside the `with`
+        closes the response, which is what stops the generation.
+
+        A paused server-tool turn is resumed the way `move` resumes one, by streaming
+        again with what it wrote so far - the move is usually in the part still to come.
         """
         request = self._request(system_prompt, messages, schema or MOVE_SCHEMA)
         client = self._client_lazy()
+        cancel = getattr(ctx, "cancel", None)
+
+        sent = request["messages"]
+        for resumes in range(_MAX_RESUMES + 1):
+            with calling(self.name), client.messages.stream(**request) as stream:
+                reader = FieldReader()
+                for event in stream:
+                    if cancel is not None:
+                        cancel.check()
+                    if event.type == "content_block_start":
+                        if getattr(event.content_block, "type", None) == "text":
+                            reader = FieldReader()
+
+                    elif event.type == "content_block_delta":
+                        if getattr(event.delta, "type", None) != "text_delta":
+                            continue          # thinking deltas are not ours to forward
+                        for name, delta, complete in reader.feed(event.delta.text):
+                            if name not in _FIELDS:
+                                continue
+                            if complete:
+                                yield "field", (name, reader.values[name])
+                            elif name == "response":
+                                yield "delta", delta
+
+                final = stream.get_final_message()
+            _note_usage(final, ctx)
+            if final.stop_reason != "pause_turn" or resumes == _MAX_RESUMES:
+                break
+            request["messages"] = [*sent, {"role": "assistant", "content": final.content}]
 
-        with client.messages.stream(**request) as stream:
-            reader, buffer = FieldReader(), ""
-            for event in stream:
-                if event.type == "content_block_start":
-                    if getattr(event.content_block, "type", None) == "text":
-                        reader, buffer = FieldReader(), ""
-
-                elif event.type == "content_block_delta":
-                    if getattr(event.delta, "type", None) != "text_delta":
-                        continue          # thinking deltas are not ours to forward
-                    text = event.delta.text
-                    buffer += text
-                    for name, delta, complete in reader.feed(text):
-                        if name not in _FIELDS:
-                            continue
-                        if complete:
-                            yield "field", (name, reader.values[name])
-                        elif name == "response":
-                            yield "delta", delta
-
-            yield "done", _parse_move(stream.get_final_message())
+        yield "done", _parse_move(final)
 
     def move(self, system_prompt, messages, ctx=None, schema=None):
         # ctx is unused: the rule and the board are already spelled out in the prompt.
-        output_config = {"format": {"type": "json_schema", "schema": schema or MOVE_SCHEMA}}
-        if self.effort:
-            output_config["effort"] = self.effort
-
-        request = {
-            "model": self.model,
-            "max_tokens": self.max_tokens,
-            "system": [{
-                "type": "text",
-                "text": system_prompt,
-                # The system prompt is fixed for a session and the transcript only ever
-                # grows at the end, so everything up to here is a stable prefix. Sonnet 5
-                # caches from 1024 tokens; the layered prompt clears that comfortably.
-                "cache_control": {"type": "ephemeral"},
-            }],
-            "output_config": output_config,
-            "messages": messages,
-        }
-
-        # Runs on Anthropic's side, so there's no execution loop to write - but it does
-        # cost seconds, and someone is watching a typing indicator. The prompt is what
-        # keeps it rare: it's for justifications that turn on something the model has no
-        # way to know, not for looking up whether two ordinary words are related.
-        if self.search:
-            request["tools"] = [{
-                "type": "web_search_20260209",
-                "name": "web_search",
-                "max_uses": self.search,
-            }]
-        # Judging whether two words are related is the one genuinely hard call in a turn,
-        # and it was being made with reasoning switched off. Leave thinking on unless a
-        # model is configured that can't do it - and note that disabling it on Sonnet 5
-        # or Opus 5 also risks a tool call arriving as plain text, which would silently
-        # never run.
-        if self.thinking:
-            request["thinking"] = {"type": self.thinking}
-
+        request = self._request(system_prompt, messages, schema or MOVE_SCHEMA)
         client = self._client_lazy()
-        resp = client.messages.create(**request)
+        with calling(self.name):
+            resp = client.messages.create(**request)
+        _note_usage(resp, ctx)
 
         # A long server-tool turn can stop early and ask to be continued. Send it straight
         # back to pick up where it left off; without this the turn returns half-finished
         # and the JSON is simply missing.
+        sent = request["messages"]
         for _ in range(_MAX_RESUMES):
             if resp.stop_reason != "pause_turn":
                 break
-            request["messages"] = [*messages, {"role": "assistant", "content": resp.content}]
-            resp = client.messages.create(**request)
+            request["messages"] = [*sent, {"role": "assistant", "content": resp.content}]
+            with calling(self.name):
+                resp = client.messages.create(**request)
+            _note_usage(resp, ctx)
 
         return _parse_move(resp)
 
+    def prewarm(self, system_prompt, messages, schema=None):
+        """Write the next turn's prefix to the cache, generating as little as possible.
+
+        The request is the real one - same system prompt, schema, tools and thinking
+        setting, since changing any of them changes what the cache would match - with
+        a placeholder where the turn block will go and `max_tokens` cut to almost
+        nothing. `_with_breakpoint` puts the breakpoint on the last real message, which
+        is the same place the next turn will look for it.
+        """
+        request = self._request(system_prompt, [*messages, _PREWARM_TURN],
+                                schema or MOVE_SCHEMA)
+        request["max_tokens"] = _PREWARM_TOKENS
+        with calling(self.name):
+            return _note_usage(self._client_lazy().messages.create(**request))
+
+
+def _with_breakpoint(messages):
+    """`messages`, with a cache breakpoint on the last one that will be resent as-is.
+
+    The system prompt was the only thing marked, so every turn paid full price for the
+    whole transcript behind it - up to forty messages, resent on every move, identical
+    but for the two at the end. Everything before the final message (the turn block,
+    which carries the board and changes every time) is exactly what the next turn will
+    send again, so that is where the breakpoint goes. Next turn it moves two messages
+    on, and the cache finds this turn's prefix by looking back from there: each turn
+    reads the last one's conversation from cache and writes only what is new.
+
+    Only pays while the start of the transcript stays put, which is what
+    state.TRANSCRIPT_PAGE is for. Returns a copy; the caller's list is not touched.
+    """
+    if len(messages) < 2:
+        return messages
+    out = list(messages)
+    stable = out[-2]
+    content = stable["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    else:
+        content = [dict(block) for block in content]
+    content[-1]["cache_control"] = {"type": "ephemeral"}
+    out[-2] = {**stable, "content": content}
+    return out
+
+
+def _note_usage(resp, ctx=None):
+    """Count what this call read from the cache, wrote to it, and paid for in full.
+
+    Returned as a dict, and added to the turn's tally when there is a `ctx`.
+    """
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return {}
+    counts = {
+        "input": getattr(usage, "input_tokens", 0) or 0,
+        "output": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_write": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+    }
+    _CACHE_READ.inc(counts["cache_read"])
+    _CACHE_WRITTEN.inc(counts["cache_write"])
+    _UNCACHED.inc(counts["input"])
+    log.info("anthropic usage: input %d, cache read %d, cache write %d, output %d",
+             counts["input"], counts["cache_read"], counts["cache_write"],
+             counts["output"])
+    if ctx is not None:
+        ctx.count(**counts)
+    return counts
+
 
 def _parse_move(resp):
     """Pull the structured move out of the response.
@@ -11,31 +11,89 @@ back into a single string throws away the context the bot needs to tell a reply
 move.
 
 `ctx` exists so a provider can see the active rule and the used words without the
-engine having to reach inside it. Model-backed providers ignore it (everything they
-need is already in the prompt); the stub uses it to play legally, and future providers
-may want it too.
+engine having to reach inside it. Model-backed providers mostly ignore it (everything
+they need is already in the prompt); the stub uses it to play legally. A streaming
+provider should also honour `ctx.cancel` when it is set - checking it between raw
+events, and raising `Cancelled` from `check()` - so an abandoned turn stops even while
+the model is thinking and there is nothing yet to yield.
+
+A provider that can say what a call cost reports it through `ctx.count`, which the
+engine sums across a turn's calls. One that calls out over the network wraps each
+request in `calling`, which is what /metrics reads its rate, errors and latency from.
 
 To add a brain: subclass Provider, implement move(), register it in __init__.py.
 """
 
+import time
+from contextlib import contextmanager
+
+from .. import metrics
+
+_INFLIGHT = metrics.gauge("model_calls_inflight",
+                          "requests out at a model provider right now, any provider")
+
+
+@contextmanager
+def calling(name):
+    """One request to provider `name`, for as long as the block runs.
+
+    Counted (`<name>_calls`), timed (`<name>_call_ms`) and in flight the whole time, so
+    a streamed call is in flight until its last event. Raising counts as an error
+    (`<name>_call_errors`); an abandoned turn doesn't, since Cancelled isn't an
+    Exception and nothing went wrong.
+    """
+    metrics.counter(f"{name}_calls", f"requests made to {name}").inc()
+    started = time.monotonic()
+    try:
+        with _INFLIGHT.track():
+            yield
+    except Exception:
+        metrics.counter(f"{name}_call_errors", f"requests to {name} that raised").inc()
+        raise
+    finally:
+        metrics.histogram(f"{name}_call_ms", f"ms per request to {name}").observe(
+            (time.monotonic() - started) * 1000)
+
 
 class TurnContext:
-    """What a provider is allowed to know about the game."""
+    """What a provider is allowed to know about the game - and where it says what the
+    turn cost."""
 
-    def __init__(self, rule, used, chain, last_word):
+    def __init__(self, rule, used, chain, last_word, cancel=None, usage=None):
         self.rule = rule
         self.used = used
         self.chain = chain
         self.last_word = last_word
+        self.cancel = cancel            # cancel.Token, or None for a turn that can't be
+        self.usage = usage              # dict the turn's token counts are added into
+
+    def count(self, **tokens):
+        """Add token counts to the turn's tally: input, output, cache_read, cache_write.
+
+        Added, not set, because one turn can be several calls - a retry, a resumed
+        pause - and what it cost is all of them. The engine counts the calls themselves
+        (`calls`) as it makes them, so a provider only reports tokens.
+        """
+        if self.usage is None:
+            return
+        for name, n in tokens.items():
+            self.usage[name] = self.usage.get(name, 0) + (n or 0)
 
 
 class Provider:
     name = "base"
 
-    def move(self, system_prompt, messages, ctx):
-        """Return a dict matching schema.MOVE_SCHEMA.
+    #: Whether `prewarm` does anything. Only a provider with a prompt cache to fill has
+    #: a use for it.
+    caches_prompts = False
 
-        Raise on failure - turn.py catches and degrades to the "?" bubble.
+    def move(self, system_prompt, messages, ctx, schema=None):
+        """Return a dict matching `schema` - schema.MOVE_SCHEMA when it's None.
+
+        The engine passes one of schema.move_schema()'s variants; a provider that can't
+        enforce a schema may ignore it, since every field past the first four is
+        optional to the engine. Raise on failure - turn.py catches and degrades to the
+        "?" bubble.
         """
         raise NotImplementedError
 
@@ -57,4 +115,14 @@ class Provider:
         one to implement streaming, and the engine treats a provider that never emits a
         delta as simply slower, not broken.
         """
-        yield "done", self.move(system_prompt, messages, ctx)
+        yield "done", self.move(system_prompt, messages, ctx, schema=schema)
+
+    def prewarm(self, system_prompt, messages, schema=None):
+        """Write `system_prompt` and `messages` to the provider's prompt cache, cheaply.
+
+        `messages` is the conversation so far, without a turn block - the prefix the
+        next turn will start with. Returns the call's token counts as a dict (see
+        `TurnContext.count`), or None where there is no cache to write.
+        """
+        return None
+
@@ -0,0 +1,189 @@
+"""Kept-alive HTTP connections for the providers that speak HTTP themselves.
+
+`urllib.request.urlopen` opens a connection, sends one request and closes it. For a
+hosted API that is a TCP handshake and a TLS handshake per call; for a model on the same
+machine it is only the TCP one, but a small local model answers in a few hundred
+milliseconds and the setup is a share of that worth having back. And a turn is not
+always one call: the response_format ladder in `OpenAIProvider.move` can be three, and a
+rule-breaking answer is retried once on top of that.
+
+So connections are kept. A `Pool` holds the idle ones per (scheme, host, port) and hands
+one out for each request, and after the response has been read to the end the connection
+goes back for the next. Stdlib `http.client`, so running a local model still adds no
+Python dependency.
+
+Bounded in both directions. At most `size` connections to one host exist at once - a
+request past that waits for one to come back rather than opening another, which is what
+keeps a burst from opening a socket per worker against a server that serves one request
+at a time anyway. At most `size` idle ones are kept; there can't be more than that open
+in the first place.
+
+A kept connection can be closed by the server while it sits idle - most servers give up
+on a quiet keep-alive after a few seconds. That surfaces as a failure to send or as an
+empty status line on the next request, before anything has been answered, and a request
+that fails that way on a reused connection is sent again once on a fresh one. A fresh
+connection failing is a real failure, and is raised.
+"""
+
+import http.client
+import json
+import ssl
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from .. import config, metrics
+
+_OPENED = metrics.counter("http_connections_opened",
+                          "provider HTTP connections opened (handshakes paid)")
+_REUSED = metrics.counter("http_connections_reused",
+                          "provider HTTP requests sent on a kept-alive connection")
+_STALE = metrics.counter("http_connections_stale",
+                         "kept-alive connections found closed by the server and replaced")
+
+#: What a server closing an idle keep-alive connection looks like from this side.
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                 ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+
+
+class HTTPError(Exception):
+    """The server answered, with a status that isn't 2xx. `body` is what it said."""
+
+    def __init__(self, url, status, reason, body=b""):
+        super().__init__(f"HTTP {status} {reason} from {url}")
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+
+class _Host:
+    def __init__(self, size):
+        self.idle = []                          # http.client connections, most recent last
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+
+
+class Pool:
+    def __init__(self, size=None):
+        self.size = size or config.HTTP_POOL
+        self._hosts = {}                        # (scheme, host, port) -> _Host
+        self._lock = threading.Lock()
+        self._tls = None
+
+    def _host(self, key):
+        with self._lock:
+            host = self._hosts.get(key)
+            if host is None:
+                host = self._hosts[key] = _Host(self.size)
+            return host
+
+    def _connect(self, key, timeout):
+        scheme, hostname, port = key
+        _OPENED.inc()
+        if scheme == "https":
+            if self._tls is None:
+                self._tls = ssl.create_default_context()
+            return http.client.HTTPSConnection(hostname, port, timeout=timeout,
+                                               context=self._tls)
+        return http.client.HTTPConnection(hostname, port, timeout=timeout)
+
+    @contextmanager
+    def request(self, method, url, body=None, headers=None, timeout=60):
+        """Send one request and yield the response, open, for the caller to read.
+
+        The connection goes back to the pool when the block exits with the response read
+        to the end and the server willing to keep it; otherwise - an exception, a
+        response abandoned halfway, `Connection: close` - it is closed. Reading a
+        response partway and leaving is how a stream is cancelled, so that has to cost
+        the connection rather than hand the next request a socket with half a reply
+        still in it.
+
+        Raises `HTTPError` for a non-2xx status, after reading the body (so the
+        connection can still be kept).
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        key = (scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80))
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = dict(headers or {})
+
+        host = self._host(key)
+        host.slots.acquire()
+        conn = None
+        try:
+            conn, response = self._send(host, key, method, path, body, headers, timeout)
+            if not 200 <= response.status < 300:
+                said = response.read()
+                self._release(host, conn, response)
+                conn = None
+                raise HTTPError(url, response.status, response.reason, said)
+            yield response
+        except BaseException:
+            if conn is not None:
+                conn.close()
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._release(host, conn, response)
+            host.slots.release()
+
+    def _send(self, host, key, method, path, body, headers, timeout):
+        with host.lock:
+            conn = host.idle.pop() if host.idle else None
+        if conn is not None:
+            _set_timeout(conn, timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                _REUSED.inc()
+                return conn, response
+            except _STALE_ERRORS:
+                conn.close()
+                _STALE.inc()
+        conn = self._connect(key, timeout)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            return conn, conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+
+    def _release(self, host, conn, response):
+        if not response.isclosed() or response.will_close:
+            conn.close()
+            return
+        with host.lock:
+            if len(host.idle) < self.size:
+                host.idle.append(conn)
+                return
+        conn.close()
+
+    def post_json(self, url, payload, headers=None, timeout=60):
+        """POST `payload` as JSON and return the decoded JSON reply."""
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        body = json.dumps(payload).encode("utf-8")
+        with self.request("POST", url, body, headers, timeout) as response:
+            return json.loads(response.read())
+
+    def close(self):
+        """Close every idle connection. In-flight ones close when they come back."""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        for host in hosts:
+            with host.lock:
+                idle, host.idle = host.idle, []
+            for conn in idle:
+                conn.close()
+
+
+def _set_timeout(conn, timeout):
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+
+
+POOL = Pool()
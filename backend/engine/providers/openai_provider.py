@@ -4,27 +4,53 @@ Anything exposing POST {base_url}/chat/completions works: Ollama, LM Studio, vLL
 llama.cpp's server, Together, Groq, OpenRouter, OpenAI itself. Point RTS_BASE_URL at
 it and go.
 
-Uses stdlib urllib so running a local model adds no Python dependency.
+Uses stdlib http.client, through a pool of kept-alive connections (connections.py), so
+running a local model adds no Python dependency and doesn't pay a handshake per call.
 
 Structured output support varies wildly across these servers, so we degrade in three
 steps rather than assuming: strict json_schema -> plain json_object -> bare prompting.
-Whatever comes back is parsed defensively, because a 7B model will happily wrap its
-JSON in prose or a ```json fence.
+The step that works is remembered per endpoint for a while, so the descent is paid
+once a day, not every turn. Whatever comes back is parsed defensively, because a 7B
+model will happily wrap its JSON in prose or a ```json fence.
+
+`stream_move` is real streaming (`stream: true`), so `/stream` on a local model shows the
+reply as it is written rather than all at once when the JSON closes.
+
+Token usage is reported to the turn (`ctx.count`) when the server returns it: always on
+a plain response, and on a stream only from the servers that put a `usage` on its last
+chunk unasked. `stream_options` would ask, but it is one more field for a strict server
+to refuse, and a refusal here would cost the turn rather than a number in the transcript.
 """
 
 import json
+import logging
+import os
 import re
-import urllib.error
-import urllib.request
+import threading
+import time
 
-from .. import config
+from .. import config, metrics
 from ..schema import MOVE_SCHEMA
-from .base import Provider
+from ..streaming import FieldReader
+from .base import Provider, calling
+from .connections import POOL, HTTPError
+
+log = logging.getLogger(__name__)
+
+_FALLBACKS = metrics.counter("openai_format_fallbacks",
+                             "response_format rungs refused by the server, stepped past")
+
+#: Statuses that mean "I don't understand that request", as opposed to "I'm unwell".
+_REJECTED = {400, 422}
 
-_JSON_NUDGE = (
-    "\n\nReturn ONLY a single JSON object matching this schema, with no prose and no "
-    "code fence:\n" + json.dumps(MOVE_SCHEMA)
-)
+# Only these are forwarded out of the scanner - a small model that prefixes its JSON
+# with a sentence can put a quoted phrase there, and that is not a field.
+_FIELDS = ("response_code", "their_word", "chosen_word", "response")
+
+
+def _nudge(schema):
+    return ("\n\nReturn ONLY a single JSON object matching this schema, with no prose "
+            "and no code fence:\n" + json.dumps(schema))
 
 
 class OpenAIProvider(Provider):
@@ -39,20 +65,16 @@ class OpenAIProvider(Provider):
             raise ValueError("RTS_BASE_URL is required when RTS_PROVIDER=openai")
 
     def _post(self, payload):
-        req = urllib.request.Request(
-            f"{self.base_url}/chat/completions",
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Content-Type": "application/json",
+        with calling(self.name):
+            return POOL.post_json(
+                f"{self.base_url}/chat/completions",
+                payload,
                 # Local servers ignore this; hosted ones require it.
-                "Authorization": f"Bearer {self.api_key or 'not-needed'}",
-            },
-        )
-        with urllib.request.urlopen(req, timeout=60) as r:
-            return json.load(r)
+                headers={"Authorization": f"Bearer {self.api_key or 'not-needed'}"},
+                timeout=60,
+            )
 
-    def move(self, system_prompt, messages, ctx=None):
-        # ctx is unused: the rule and the board are already spelled out in the prompt.
+    def _attempts(self, system_prompt, messages, schema, **extra):
         base = {
             "model": self.model,
             "max_tokens": self.max_tokens,
@@ -60,32 +82,228 @@ class OpenAIProvider(Provider):
                 {"role": "system", "content": system_prompt},
                 *messages,
             ],
+            **extra,
         }
 
         # Best to worst. Servers that don't understand a response_format 400 on it, so
-        # try the strict form first and fall back rather than probing capabilities.
-        attempts = [
+        # try the strict form first and fall back rather than probing capabilities -
+        # once. Where the walk ends is remembered per endpoint (see `_Formats`), and
+        # later turns start there until it expires.
+        return [
             {**base, "response_format": {
                 "type": "json_schema",
-                "json_schema": {"name": "rts_move", "strict": True, "schema": MOVE_SCHEMA},
+                "json_schema": {"name": "rts_move", "strict": True, "schema": schema},
             }},
             {**base, "response_format": {"type": "json_object"}},
             {**base, "messages": [
-                {"role": "system", "content": system_prompt + _JSON_NUDGE},
+                {"role": "system", "content": system_prompt + _nudge(schema)},
                 *messages,
             ]},
         ]
 
-        last_error = None
-        for payload in attempts:
+    def _refused(self, rung, attempts, error):
+        """Whether `error` is the server turning this rung down, so a looser one is next.
+
+        Nothing is learned yet. A 400 is also what a context overflow, an unknown model
+        or a malformed message gets, and those fail the same way on every rung - so the
+        ladder only moves for the next turn once a looser rung has actually worked.
+        """
+        if error.status in _REJECTED and rung < len(attempts) - 1:
+            _FALLBACKS.inc()
+            return True
+        return False
+
+    def _exhausted(self, key, start, error):
+        if start and error is not None and error.status in _REJECTED:
+            # Even the rung we learned is refused now - the server, or what is behind
+            # the URL, has changed. Walk the whole ladder again next turn.
+            FORMATS.forget(key)
+        return RuntimeError(f"all chat/completions attempts failed: {error}")
+
+    def move(self, system_prompt, messages, ctx=None, schema=None):
+        # ctx is unused: the rule and the board are already spelled out in the prompt.
+        attempts = self._attempts(system_prompt, messages, schema or MOVE_SCHEMA)
+        key = (self.base_url, self.model)
+        start = FORMATS.get(key)
+        last_error, refused = None, False
+        for rung in range(start, len(attempts)):
             try:
-                data = self._post(payload)
-            except urllib.error.HTTPError as e:
+                data = self._post(attempts[rung])
+            except HTTPError as e:
                 last_error = e
-                continue  # server rejected this response_format - try a looser one
+                refused = self._refused(rung, attempts, e) or refused
+                continue
+            if refused:
+                FORMATS.learn(key, rung)
+            _note_usage(data.get("usage"), ctx)
             return _parse_move(data["choices"][0]["message"]["content"])
+        raise self._exhausted(key, start, last_error)
+
+    def stream_move(self, system_prompt, messages, ctx=None, schema=None):
+        """Yield the move as it is written. See Provider.stream_move for the protocol.
+
+        `stream: true` turns the reply into server-sent events, one `data:` line per
+        chunk of text, ending with `data: [DONE]`; the text goes through the same
+        FieldReader the Anthropic provider uses. Every server this provider targets
+        streams, including the ones that ignore response_format, so the ladder is the
+        same as `move`'s - and a refused rung is refused before anything is yielded,
+        which is what makes stepping down mid-stream safe.
+
+        `ctx.cancel` is checked on every line. Raising inside the request closes the
+        connection rather than returning it to the pool, and a closed connection is the
+        one signal every one of these servers understands as "stop generating".
+        """
+        attempts = self._attempts(system_prompt, messages, schema or MOVE_SCHEMA,
+                                  stream=True)
+        cancel = getattr(ctx, "cancel", None)
+        key = (self.base_url, self.model)
+        start = FORMATS.get(key)
+        last_error, refused = None, False
+        for rung in range(start, len(attempts)):
+            try:
+                yield from self._stream(attempts[rung], cancel, ctx)
+            except HTTPError as e:
+                last_error = e
+                refused = self._refused(rung, attempts, e) or refused
+                continue
+            if refused:
+                FORMATS.learn(key, rung)
+            return
+        raise self._exhausted(key, start, last_error)
+
+    def _stream(self, payload, cancel, ctx=None):
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {self.api_key or 'not-needed'}",
+        }
+        body = json.dumps(payload).encode("utf-8")
+        reader, text, finished = FieldReader(), [], False
+        url = f"{self.base_url}/chat/completions"
+        with calling(self.name), POOL.request("POST", url, body, headers,
+                                              timeout=60) as response:
+            for line in response:
+                if cancel is not None:
+                    cancel.check()
+                # Read on past [DONE] to the end of the body, so the connection is
+                # clean and goes back to the pool.
+                if finished or not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    finished = True
+                    continue
+                chunk = json.loads(data)
+                _note_usage(chunk.get("usage"), ctx)
+                choices = chunk.get("choices") or ()
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if not delta:
+                    continue
+                text.append(delta)
+                for name, piece, complete in reader.feed(delta):
+                    if name not in _FIELDS:
+                        continue
+                    if complete:
+                        yield "field", (name, reader.values[name])
+                    elif name == "response":
+                        yield "delta", piece
+        yield "done", _parse_move("".join(text))
+
+
+def _note_usage(usage, ctx):
+    """Report an OpenAI-shaped `usage` block to the turn, split the way Anthropic's is.
+
+    `prompt_tokens` includes whatever was served from a prompt cache, which OpenAI and
+    vLLM report separately under `prompt_tokens_details`; it is taken out, so `input`
+    means uncached input from either provider. Nobody here reports a cache write.
+    """
+    if not usage or ctx is None:
+        return
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    ctx.count(input=max((usage.get("prompt_tokens") or 0) - cached, 0),
+              output=usage.get("completion_tokens") or 0,
+              cache_read=cached)
+
+
+class _Formats:
+    """Which rung of the response_format ladder each endpoint accepts.
+
+    Keyed by (base_url, model), because the answer belongs to the server and sometimes
+    to the model behind it - vLLM enforces a schema for any model, Ollama only for some.
+    A server that refused the strict form used to be sent it anyway, and refuse it again,
+    on every move for as long as the process lived: one wasted round-trip per turn,
+    forever. Now it is refused once.
+
+    Only a rejection followed by a looser rung that works teaches anything. A 5xx or a
+    dropped connection says nothing about what the server understands, and neither does
+    a 400 that every rung gets - an oversized prompt, a misspelt model - so those move
+    the current turn along the ladder without moving where the next turn starts.
+
+    What is learned lasts `FORMAT_TTL_S`, then the strict form is tried again. Servers
+    get upgraded, and a rung learned from one bad afternoon shouldn't outlive it.
+
+    With RTS_FORMAT_CACHE set to a path, what is learned is also written there, so a
+    restart doesn't probe again - until it would have expired anyway.
+    """
+
+    def __init__(self, path="", ttl_s=None, clock=time.time):
+        self._path = path
+        self._ttl_s = config.FORMAT_TTL_S if ttl_s is None else ttl_s
+        self._clock = clock
+        self._known = {}                        # (base_url, model) -> (rung, learned at)
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    saved = json.load(f)
+                # A bare rung is the format from before entries expired; it gets a
+                # full lifetime from now.
+                self._known = {tuple(k.split("|", 1)): (int(v), self._clock())
+                               if isinstance(v, int) else (int(v[0]), float(v[1]))
+                               for k, v in saved.items()}
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, TypeError, IndexError) as e:
+                log.warning("ignoring response_format cache %s: %s", path, e)
+
+    def get(self, key):
+        with self._lock:
+            rung, at = self._known.get(key, (0, 0))
+            if rung and self._clock() - at > self._ttl_s:
+                # Expired: back to the top of the ladder. If the server still refuses the
+                # strict form, that turn relearns the rung.
+                del self._known[key]
+                self._save()
+                return 0
+            return rung
+
+    def learn(self, key, rung):
+        with self._lock:
+            if self._known.get(key, (0, 0))[0] >= rung:
+                return
+            self._known[key] = (rung, self._clock())
+            self._save()
+        log.info("%s %s: response_format falls back to rung %d", *key, rung)
+
+    def forget(self, key):
+        with self._lock:
+            if self._known.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        # Caller holds the lock.
+        if not self._path:
+            return
+        try:
+            tmp = self._path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({f"{u}|{m}": list(v) for (u, m), v in self._known.items()}, f)
+            os.replace(tmp, self._path)
+        except OSError as e:
+            log.warning("could not write response_format cache %s: %s", self._path, e)
+
 
-        raise RuntimeError(f"all chat/completions attempts failed: {last_error}")
+FORMATS = _Formats(config.FORMAT_CACHE)
 
 
 def _parse_move(content):
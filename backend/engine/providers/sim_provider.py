@@ -0,0 +1,193 @@
+"""A brain that takes as long as a real one, with no network - for load tests.
+
+The stub answers instantly with a single `done`, which proves the plumbing and nothing
+about how it holds up: a real turn keeps a worker busy for seconds, and what it sends
+arrives a few characters at a time. Offline, that part of the system was never under
+load - the gate, `Sink.consume`, play_stream's queue, a room waiting on its bot.
+
+This plays like the stub and answers like a model. It waits `SIM_TTFT_MS` before the
+first token, then writes the move out as JSON at `SIM_TOKENS_PER_S`, a few characters
+per token, through the same FieldReader the real providers use - so what comes out is
+the same `field`, `delta`, `done` sequence, at about the same pace. It honours
+`ctx.cancel` on every token, as a real stream does, and reports the tokens it read and
+wrote to `ctx.count`, so the usage columns fill in as they would.
+
+A model that always takes exactly 600ms is not the one in production, so each call is
+also dealt a fate, from the SIM_* knobs in config.py:
+
+  pace     the call's speed, scattered around the two numbers above by SIM_JITTER, and
+           SIM_TAIL_X times slower again for SIM_TAIL_RATE of calls - the slow tail.
+  error    SIM_ERROR_RATE of calls raise partway through, as a 5xx or a dropped stream
+           does: streamed, at a random token, so some turns fail after their text began.
+  timeout  SIM_TIMEOUT_RATE of calls never send a first token, and raise TimeoutError
+           after SIM_TIMEOUT_S, as the real providers' read timeout does.
+  illegal  SIM_ILLEGAL_RATE of moves play a word that breaks the rule or was already
+           played. The engine catches those, not this; that is the retry path under load.
+
+SIM_SEED makes the dice repeatable, so the run that found something can be run again.
+
+It also has more words than the stub's fifteen. A load test runs chains hundreds of
+words long, and a stub that concedes at the sixteenth measures conceding.
+"""
+
+import json
+import random
+import time
+
+from .. import config
+from ..streaming import FieldReader
+from .base import calling
+from .stub_provider import StubProvider
+
+# Roughly what a model's tokenizer averages on English prose.
+_CHARS_PER_TOKEN = 4
+
+_FIELDS = ("response_code", "their_word", "chosen_word", "response")
+
+_ONSETS = ("b", "c", "d", "f", "g", "h", "k", "l", "m", "n", "p", "v", "w", "z",
+           "bl", "cr", "dr", "fl", "gl", "pl", "pr", "sk", "sl", "sp", "st", "tr")
+_VOWELS = ("a", "e", "i", "o", "u", "ai", "ea", "oo")
+_CODAS = ("", "", "n", "m", "l", "r", "st", "nd", "ck", "sh")
+
+
+def _given(value, default):
+    return default if value is None else value
+
+
+class SimProvider(StubProvider):
+    name = "sim"
+
+    def __init__(self, ttft_ms=None, tokens_per_s=None, seed=None, jitter=None,
+                 tail_rate=None, tail_x=None, error_rate=None, timeout_rate=None,
+                 timeout_s=None, illegal_rate=None):
+        self.ttft_s = _given(ttft_ms, config.SIM_TTFT_MS) / 1000
+        self.tokens_per_s = max(_given(tokens_per_s, config.SIM_TOKENS_PER_S), 0)
+        self.jitter = _given(jitter, config.SIM_JITTER)
+        self.tail_rate = _given(tail_rate, config.SIM_TAIL_RATE)
+        self.tail_x = _given(tail_x, config.SIM_TAIL_X)
+        self.error_rate = _given(error_rate, config.SIM_ERROR_RATE)
+        self.timeout_rate = _given(timeout_rate, config.SIM_TIMEOUT_RATE)
+        self.timeout_s = _given(timeout_s, config.SIM_TIMEOUT_S)
+        self.illegal_rate = _given(illegal_rate, config.SIM_ILLEGAL_RATE)
+        self.model = f"sim-{int(self.ttft_s * 1000)}ms-{self.tokens_per_s:g}tps"
+        self._rng = random.Random(_given(seed, config.SIM_SEED))
+
+    def _decide(self, messages, ctx, schema):
+        move = StubProvider.move(self, None, messages, ctx, schema=schema)
+        if move.get("response_code") == "CONCEDE":
+            word = self._word(ctx)
+            if word:
+                move = {"response_code": "OK", "chosen_word": word,
+                        "train_of_thought": [[word]], "response": word}
+        if move.get("chosen_word") and self._rng.random() < self.illegal_rate:
+            word = self._illegal(ctx)
+            if word:
+                move.update(chosen_word=word, train_of_thought=[[word]], response=word)
+        # In the schema's order, as a model writes it: the words land before the reply
+        # starts, which is what the gate is waiting on.
+        order = list((schema or {}).get("properties", ()))
+        return dict(sorted(move.items(),
+                           key=lambda kv: order.index(kv[0]) if kv[0] in order else 99))
+
+    def _word(self, ctx):
+        """A made-up word the rule allows and nobody has played, or "" after a while."""
+        for _ in range(50):
+            word = self._made_up()
+            if ctx.rule.allows(word) and word not in ctx.used:
+                return word
+        return ""
+
+    def _illegal(self, ctx):
+        """A word the engine has to turn down: played already, or against the rule."""
+        if ctx.used and self._rng.random() < 0.5:
+            return self._rng.choice(sorted(ctx.used))
+        for _ in range(50):
+            word = self._made_up()
+            if not ctx.rule.allows(word):
+                return word
+        return ""
+
+    def _made_up(self):
+        return "".join((self._rng.choice(_ONSETS), self._rng.choice(_VOWELS),
+                        self._rng.choice(_ONSETS), self._rng.choice(_VOWELS),
+                        self._rng.choice(_CODAS)))
+
+    def _deal(self):
+        """One call's fate: (seconds to first token, seconds per token after, failure).
+
+        The failure is None, "error" or "timeout". Jitter is lognormal because latency
+        is - bounded below, long on the right - and the tail is a separate multiplier
+        because a stall behind someone else's request is not just an unlucky draw.
+        """
+        pace = self._rng.lognormvariate(0, self.jitter) if self.jitter > 0 else 1.0
+        if self._rng.random() < self.tail_rate:
+            pace *= self.tail_x
+        roll = self._rng.random()
+        failure = ("timeout" if roll < self.timeout_rate else
+                   "error" if roll < self.timeout_rate + self.error_rate else None)
+        token_s = pace / self.tokens_per_s if self.tokens_per_s else 0.0
+        return self.ttft_s * pace, token_s, failure
+
+    def _fail(self, failure, cancel):
+        if failure == "timeout":
+            self._wait(self.timeout_s, cancel)
+            raise TimeoutError(f"sim: no first token in {self.timeout_s:g}s")
+        raise RuntimeError("sim: injected provider error")
+
+    def move(self, system_prompt, messages, ctx, schema=None):
+        data = self._decide(messages, ctx, schema)
+        cancel = getattr(ctx, "cancel", None)
+        text = json.dumps(data)
+        ttft_s, token_s, failure = self._deal()
+        with calling(self.name):
+            if failure == "timeout":
+                self._fail(failure, cancel)
+            took = ttft_s + len(text) / _CHARS_PER_TOKEN * token_s
+            if failure == "error":
+                self._wait(took * self._rng.random(), cancel)
+                self._fail(failure, cancel)
+            self._wait(took, cancel)
+        self._count(ctx, system_prompt, messages, text)
+        return data
+
+    def stream_move(self, system_prompt, messages, ctx, schema=None):
+        data = self._decide(messages, ctx, schema)
+        cancel = getattr(ctx, "cancel", None)
+        text = json.dumps(data)
+        ttft_s, token_s, failure = self._deal()
+        fail_at = self._rng.randrange(0, len(text), _CHARS_PER_TOKEN) \
+            if failure == "error" else None
+        reader = FieldReader()
+        # Counted as a call like any other, so /metrics shows a load test's model calls
+        # out and their time exactly where it would show a real provider's.
+        with calling(self.name):
+            if failure == "timeout":
+                self._fail(failure, cancel)
+            self._wait(ttft_s, cancel)
+            for i in range(0, len(text), _CHARS_PER_TOKEN):
+                self._wait(token_s, cancel)
+                if i == fail_at:
+                    self._fail(failure, cancel)
+                for name, piece, complete in reader.feed(text[i:i + _CHARS_PER_TOKEN]):
+                    if name not in _FIELDS:
+                        continue
+                    if complete:
+                        yield "field", (name, reader.values[name])
+                    elif name == "response":
+                        yield "delta", piece
+        self._count(ctx, system_prompt, messages, text)
+        yield "done", data
+
+    @staticmethod
+    def _count(ctx, system_prompt, messages, text):
+        if ctx is None:
+            return
+        read = json.dumps([system_prompt, messages], default=str)
+        ctx.count(input=len(read) // _CHARS_PER_TOKEN, output=len(text) // _CHARS_PER_TOKEN)
+
+    @staticmethod
+    def _wait(seconds, cancel):
+        if cancel is not None:
+            cancel.sleep(seconds)
+        elif seconds > 0:
+            time.sleep(seconds)
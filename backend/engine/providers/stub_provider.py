@@ -16,17 +16,20 @@ _POOL = [
 class StubProvider(Provider):
     name = "stub"
 
-    def move(self, system_prompt, messages, ctx):
-        pick = next(
-            (w for w in _POOL if ctx.rule.allows(w) and w not in ctx.used),
-            "",
-        )
+    def move(self, system_prompt, messages, ctx, schema=None):
+        if schema is not None and "chosen_word" not in schema["properties"]:
+            return {"response": "that one's mine. another game?"}
+        legal = [w for w in _POOL if ctx.rule.allows(w) and w not in ctx.used]
+        pick = legal[0] if legal else ""
         if not pick:
             return {"response_code": "CONCEDE", "chosen_word": "",
                     "train_of_thought": [], "response": "ok, you got me"}
-        return {
+        move = {
             "response_code": "OK",
             "chosen_word": pick,
             "train_of_thought": [[pick]],
             "response": pick,
         }
+        if schema and "candidates" in schema["properties"]:
+            move["candidates"] = legal[1:4]
+        return move
@@ -29,6 +29,8 @@ import threading
 import time
 import unicodedata
 
+from . import bus, metrics
+from .clock import SCHEDULER
 from .state import Game
 
 BOT_ID = "bot"
@@ -100,6 +102,10 @@ class Room:
         # being started for the same seat by two messages landing together.
         self.thinking = False
 
+        # The cancel token for that turn, so whatever moves the room on can abandon it
+        # rather than wait for an answer about a board that no longer exists.
+        self.inflight = None
+
         # Set once, by whoever is running turns for this room. Kept as a hook rather
         # than an import so rooms.py stays free of the turn logic that uses it.
         self.on_expire = None
@@ -283,11 +289,8 @@ class Room:
         if not self.playing:
             return
 
-        expiring = self.turn
-        timer = threading.Timer(TURN_S, self._expired, args=(expiring,))
-        timer.daemon = True
-        self._clock = timer
-        timer.start()
+        # One shared scheduler thread rather than a Timer (and a thread) per arm.
+        self._clock = SCHEDULER.call_later(TURN_S, self._expired, self.turn)
 
     def disarm(self):
         if self._clock is not None:
@@ -295,6 +298,8 @@ class Room:
             self._clock = None
 
     def _expired(self, whose):
+        # Runs on the scheduler's thread (clock.py), so it must not block.
+        #
         # The turn may have moved on between this timer firing and it getting the
         # lock - somebody answering in the last few milliseconds. Whoever it was is
         # no longer late, so there is nothing to skip.
@@ -396,11 +401,19 @@ class RoomStore:
         rooms.sort(key=lambda r: (-len(r.members), -r.last_active))
         return [r.public() for r in rooms]
 
+    def count(self):
+        return len(self._rooms)
+
+    def members(self):
+        """People in a room right now, across every room."""
+        return sum(len(r.members) for r in list(self._rooms.values()))
+
     def drop(self, room_id):
         with self._lock:
             room = self._rooms.pop(room_id, None)
         if room:
             room.disarm()
+            bus.BUS.drop(room_id)
 
     def _sweep(self):
         """Drop rooms nobody has been in for a while. Caller holds the lock."""
@@ -408,13 +421,20 @@ class RoomStore:
         for room_id, room in list(self._rooms.items()):
             if room.empty and room.last_active < cutoff:
                 room.disarm()
+                bus.BUS.drop(room_id)
                 del self._rooms[room_id]
 
         if len(self._rooms) > MAX_ROOMS:
             for room_id, room in sorted(self._rooms.items(),
                                         key=lambda kv: kv[1].last_active)[:-MAX_ROOMS]:
                 room.disarm()
+                bus.BUS.drop(room_id)
                 del self._rooms[room_id]
 
 
 ROOMS = RoomStore()
+
+metrics.gauge("rooms_open", "rooms held in memory, empty ones not yet swept included",
+              fn=ROOMS.count)
+metrics.gauge("room_members", "people in a room right now, across every room",
+              fn=ROOMS.members)
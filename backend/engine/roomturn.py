@@ -17,19 +17,35 @@ walking off to make tea is not a reason to throw away a chain the other three bu
 the consequences are all "your turn passes": the miss is recorded against the player and
 shows up in the score, the board carries on.
 
-The bot's turn runs on a worker thread. Everything that touches room state takes
+The bot's turn runs on the shared turn pool (workers.py), queued by the room's
+deadline so the bot closest to running out of time goes first. Everything that touches
+room state takes
 `room.lock`, and the model call deliberately happens outside it - holding the lock across
 a two-second request would stop everyone else in the room from typing while the bot
 thinks, which is the one moment they're most likely to want to.
 """
 
-import threading
 import time
 import uuid
 
-from . import bus, history, prompts, rules, transcript
+from . import (bus, cancel, history, metrics, prewarm, profiler, prompts, rules,
+               sketch, transcript)
 from .providers import TurnContext, get_provider
 from .rooms import BOT_ID, BOT_NAME, ROOMS
+from .schema import move_schema
+from .spans import Spans
+from .turn import Sink
+from .workers import POOL
+
+# Shared with turn.py - the registry hands both the same counters.
+_RETRIES = metrics.counter("turn_retries",
+                           "second model calls made because the bot's word was illegal")
+_RESCUED = metrics.counter("turn_retries_avoided",
+                           "illegal bot words replaced from the move's own candidates")
+_BOT_TURNS = metrics.counter("room_bot_turns", "bot turns in rooms that got an answer")
+_BOT_ERRORS = metrics.counter("room_bot_turns_errored",
+                              "bot turns in rooms that raised and were passed with \"?\"")
+_BOT_LATENCY = metrics.histogram("room_bot_turn_ms", "ms per bot turn in a room")
 
 
 # ---------------------------------------------------------------------------
@@ -83,6 +99,7 @@ def leave(room, user_id):
             return
         name = member.name
         room.leave(user_id)
+        _abandon(room, "everyone left" if room.empty else "turn moved on")
         _post(room, _msg(room, None, name, f"{name} left", kind="system"))
         _state(room)
         due = room.bot_turn
@@ -107,9 +124,13 @@ def configure(room, *, bot=None, timer=None, reverse=None):
             said.append("clock's on" if room.timer else "clock's off")
         if reverse is not None and bool(reverse) != room.game.rule.reverse:
             room.game.set_reverse(reverse)
+            # Still the bot's go, but whatever it is writing was chosen under the
+            # other rule. Start it again rather than post a word that is now illegal.
+            _abandon(room, "rules changed", force=True)
             said.append("new rules... every word has to start with r t or s now"
                         if reverse else
                         "back to normal - no word can start with r, t or s")
+        _abandon(room, "bot switched off")
         for line in said:
             _post(room, _msg(room, None, None, line, kind="system"))
         _state(room)
@@ -242,6 +263,7 @@ def expire(room, whose):
         # produces is a screen of "X ran out of time" for anyone who does come back.
         if room.deserted:
             room.idle = True
+            _abandon(room, "room went idle", force=True)
             room.disarm()
             room.deadline = None
             _bot_says(room, _resting(room))
@@ -249,6 +271,7 @@ def expire(room, whose):
             return
 
         room.advance()
+        _abandon(room, "ran out of time")
         _bot_says(room, f"{name} ran out of time" + _whos_up(room))
         _state(room)
         due = room.bot_turn
@@ -256,6 +279,18 @@ def expire(room, whose):
         _wake(room)
 
 
+def _abandon(room, reason, force=False):
+    """Cancel the bot's turn if it is out at the model and no longer wanted.
+
+    No longer wanted means it is no longer the bot's go - unless `force`, for changes
+    that leave it the bot's go but spoil the answer it was writing. Caller holds the
+    lock. The cancelled turn re-wakes itself if the seat is still the bot's.
+    """
+    token = room.inflight
+    if token is not None and (force or not room.bot_turn):
+        token.cancel(reason)
+
+
 def _resting(room):
     """What the room says when it stops waiting. Says how to start it again."""
     word = room.game.last_word
@@ -273,26 +308,55 @@ def _wake(room):
         if room.thinking or not room.bot_turn or room.idle:
             return
         room.thinking = True
-    threading.Thread(target=_bot_turn, args=(room,), daemon=True).start()
+        deadline = room.deadline
+    POOL.submit(profiler.tagged("bot", _bot_turn), room, deadline=deadline)
 
 
 def _bot_turn(room):
-    started = time.monotonic()
+    # It may have queued for a while. If the room has moved on meanwhile - the clock
+    # ran out, the bot was switched off - there is no turn left to take.
+    token = cancel.Token()
+    with room.lock:
+        if not room.bot_turn:
+            room.thinking = False
+            return
+        room.inflight = token
+    spans = Spans()
+    started = spans.started
+    sink = Sink(lambda text: None, cancel=token)
+    usage = {}
     bus.BUS.publish(room.id, "thinking", {"room": room.id})
     try:
-        data = _ask(room)
+        data = _ask(room, sink=sink, usage=usage, spans=spans)
         chosen = _clean(data.get("chosen_word"))
+        reply = (data.get("response") or "").strip()
 
-        # One retry on an illegal word, same as solo. The board is not up for
-        # negotiation whatever came back, but a second look is usually all it takes,
-        # and the alternative is the bot's whole go passing in silence.
+        # One retry on an illegal word, same as solo - unless the move brought its own
+        # backups and one of them is legal, which is the same second look without the
+        # second call. The board is not up for negotiation whatever came back, but a
+        # second look is usually all it takes, and the alternative is the bot's whole
+        # go passing in silence.
         if data.get("response_code") == "OK" and not _legal(room, chosen):
-            data = _ask(room, "you played a word that breaks the letter rule or has "
-                              "already been played. Play a legal one.")
-            chosen = _clean(data.get("chosen_word"))
+            with room.lock:
+                backup = rules.first_legal(data.get("candidates"), room.game.rule,
+                                           room.game.used)
+            if backup:
+                _RESCUED.inc()
+                chosen = reply = backup
+            else:
+                _RETRIES.inc()
+                data = _ask(room, "you played a word that breaks the letter rule or has "
+                                  "already been played. Play a legal one.",
+                            sink=sink, usage=usage, spans=spans)
+                chosen = _clean(data.get("chosen_word"))
+                reply = (data.get("response") or "").strip()
 
-        reply = (data.get("response") or "").strip()
         elapsed = int((time.monotonic() - started) * 1000)
+        _BOT_TURNS.inc()
+        _BOT_LATENCY.observe(elapsed)
+        # Not streamed in sketch's sense: the model streams, but nobody sees a token of
+        # it until the bot posts, so the solo streaming series stays solo.
+        sketch.observe("room", data.get("response_code"), get_provider(), False, elapsed)
 
         with room.lock:
             # The room can move on while the model is thinking - the bot switched off,
@@ -314,27 +378,54 @@ def _bot_turn(room):
             # a joke - it had its turn and used it, and the rotation carries on.
             room.advance()
             _bot_says(room, reply or "...", code=data.get("response_code"), link=link,
-                      latency_ms=elapsed)
+                      latency_ms=elapsed, usage=usage,
+                      spans=spans.finish(spans.since()))
             _state(room)
+            if sink.first_at is not None:
+                prewarm.observe(room.id, (sink.first_at - started) * 1000)
+            prewarm.after(room.id, room.game, usage, room=True)
+    except cancel.Cancelled:
+        pass                            # the room moved on; see _abandon
     except Exception:                                   # noqa: BLE001
+        _BOT_ERRORS.inc()
         with room.lock:
             if room.bot_turn:
                 room.advance()
                 _bot_says(room, "?", code="ERROR")
                 _state(room)
     finally:
-        room.thinking = False
+        with room.lock:
+            room.thinking = False
+            room.inflight = None
+            # Cancelled, but still the bot's go - the rules changed under it. Whatever
+            # did that already tried to wake a turn and found this one in the way.
+            again = token.cancelled and room.bot_turn
+    if again:
+        _wake(room)
+
 
+def _ask(room, correction=None, sink=None, usage=None, spans=None):
+    """The bot's move, streamed so that an abandoned turn can stop the model mid-answer.
 
-def _ask(room, correction=None):
+    Nothing is shown as it arrives - a room's message appears whole - so the stream is
+    only drained through `sink`. What streaming buys here is the ability to hang up.
+    """
     game = room.game
-    ctx = TurnContext(game.rule, game.used, game.chain, game.last_word)
-    system = prompts.system_prompt(game.rule, room=True)
-    # No player_input: several people may have spoken since the bot's last go, and they
-    # are all in the transcript already. Handing one of them over as "they just said"
-    # would single out whoever happened to be last.
-    conversation = prompts.messages(game, "", correction, None, room=room)
-    return get_provider().move(system, conversation, ctx)
+    sink = sink or Sink(lambda text: None)
+    spans = spans if spans is not None else Spans()
+    ctx = TurnContext(game.rule, game.used, game.chain, game.last_word,
+                      cancel=sink.cancel, usage=usage)
+    ctx.count(calls=1)
+    with spans.stage("prompt"):
+        system = prompts.system_prompt(game.rule, room=True)
+        # No player_input: several people may have spoken since the bot's last go, and
+        # they are all in the transcript already. Handing one of them over as "they just
+        # said" would single out whoever happened to be last.
+        conversation = prompts.messages(game, "", correction, None, room=room)
+    with spans.call() as call:
+        return sink.consume(
+            get_provider().stream_move(system, conversation, ctx, move_schema()),
+            spans, call)
 
 
 def _legal(room, word):
@@ -364,14 +455,18 @@ def _msg(room, user_id, name, text, kind="say", code=None, link=None, flag=None)
     }
 
 
-def _bot_says(room, text, code=None, link=None, latency_ms=None):
+def _bot_says(room, text, code=None, link=None, latency_ms=None, usage=None, spans=None):
     room.game.remember("assistant", text)
     return _post(room, _msg(room, BOT_ID, BOT_NAME, text, kind="bot", code=code,
-                            link=link), latency_ms=latency_ms)
+                            link=link), latency_ms=latency_ms, usage=usage, spans=spans)
+
 
+def _post(room, message, latency_ms=None, usage=None, spans=None):
+    """Everything a message has to reach: the room, everyone watching, the record.
 
-def _post(room, message, latency_ms=None):
-    """Everything a message has to reach: the room, everyone watching, the record."""
+    Called with the room's lock held, which is fine only because none of the three
+    blocks: the record is queued for transcript.py's writer, not written here.
+    """
     room.append(message)
     bus.BUS.publish(room.id, "message", message)
     transcript.record_message(
@@ -385,6 +480,8 @@ def _post(room, message, latency_ms=None):
         user_name=message.get("name"),
         link=message.get("link"),
         latency_ms=latency_ms,
+        usage=usage,
+        spans=spans,
     )
     return message
 
@@ -88,6 +88,91 @@ def is_single_word(text):
     return bool(_WORD.fullmatch((text or "").strip()))
 
 
+#: How alike two words must be (difflib's ratio) before the fuzzy check calls them one.
+SIMILAR = 0.85
+
+#: The trivial variations `is_variation` recognises, as suffixes: dog/dogs, box/boxes,
+#: jump/jumped, run/running.
+_SUFFIXES = ("s", "es", "ed", "ing")
+
+
+class UsedWords:
+    """The words already spent in a game, indexed for the two duplicate checks.
+
+    Behaves like the set it replaces - `in`, iteration, `len`, `|` - because everything
+    that only wants to know what has been played shouldn't have to care. What it adds
+    is a second view of the same words, bucketed by length, kept up to date by `add`.
+
+    Both checks sit on the hot path of every move, and the streaming gate runs them
+    mid-stream; a marathon room's chain runs to hundreds of words. Scanning all of them
+    per check made each check cost the length of the chain. Now:
+
+      is_variation          hash lookups, one per suffix - the same answer as comparing
+                            against every word, without visiting any of them. That part
+                            works on a plain set too; see `is_variation`.
+      looks_like_duplicate  only words whose length could possibly reach `SIMILAR` are
+                            compared at all, and difflib's cheap upper bounds are tried
+                            before its real ratio. Same answers, a handful of candidates.
+    """
+
+    __slots__ = ("_words", "_by_length")
+
+    def __init__(self, words=()):
+        self._words = set()
+        self._by_length = {}                    # len -> {word}
+        for w in words:
+            self.add(w)
+
+    def add(self, word):
+        if word in self._words:
+            return
+        self._words.add(word)
+        self._by_length.setdefault(len(word), set()).add(word)
+
+    def copy(self):
+        out = UsedWords()
+        out._words = set(self._words)
+        out._by_length = {n: set(ws) for n, ws in self._by_length.items()}
+        return out
+
+    def __or__(self, other):
+        out = self.copy()
+        for w in other:
+            out.add(w)
+        return out
+
+    def __contains__(self, word):
+        return word in self._words
+
+    def __iter__(self):
+        return iter(self._words)
+
+    def __len__(self):
+        return len(self._words)
+
+    def __repr__(self):
+        return f"UsedWords({sorted(self._words)!r})"
+
+    def near_in_length(self, word, cutoff=SIMILAR):
+        """Words whose length alone doesn't rule out a ratio of `cutoff` against `word`.
+
+        The bound is difflib's own `real_quick_ratio`: two strings can share at most as
+        many characters as the shorter one has, so their ratio is at most
+        2*min/(sum of lengths). Same formula, so nothing that could pass is left out.
+        """
+        n = len(word)
+        for m, words in self._by_length.items():
+            if n + m and 2.0 * min(n, m) / (n + m) >= cutoff:
+                yield from words
+
+
+def _similar(word, other, cutoff=SIMILAR):
+    """difflib's ratio, with its two cheap upper bounds tried first."""
+    matcher = difflib.SequenceMatcher(None, word, other)
+    return (matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff
+            and matcher.ratio() >= cutoff)
+
+
 def looks_like_duplicate(word, used):
     """Would anyone actually call this word a repeat?
 
@@ -106,24 +191,40 @@ def looks_like_duplicate(word, used):
     w = (word or "").lower()
     if is_variation(w, used):
         return True
-    return any(difflib.SequenceMatcher(None, w, u).ratio() >= 0.85 for u in used)
+    candidates = used.near_in_length(w) if isinstance(used, UsedWords) else used
+    return any(_similar(w, u) for u in candidates)
+
+
+def first_legal(words, rule, used):
+    """The first of `words` that `rule` allows and that isn't a replay, or "".
+
+    For the ranked backups a move can carry (schema.py, "candidates"). Anything that
+    isn't a single word is skipped rather than trusted - the list is the model's, and
+    a phrase in it is not a move.
+    """
+    for word in words or ():
+        word = (word or "").strip().lower() if isinstance(word, str) else ""
+        if is_single_word(word) and rule.allows(word) and not is_variation(word, used):
+            return word
+    return ""
 
 
 def is_variation(word, used):
     """Cheap trivial-variation check (plural / simple tense) against used words.
 
+    "w is u plus a suffix" is "w minus that suffix is in used", and "u is w plus a
+    suffix" is "w plus it is in used" - so this looks words up rather than walking
+    them, and costs the same against three words or three hundred. `used` only has to
+    support `in`.
+
     Not exhaustive - see looks_like_duplicate for the fuzzier backstop.
     """
     w = (word or "").lower()
     if w in used:
         return True
-    for u in used:
-        if w == u + "s" or u == w + "s":       # dog / dogs
-            return True
-        if w == u + "es" or u == w + "es":     # box / boxes
-            return True
-        if w == u + "ed" or u == w + "ed":     # jump / jumped
+    for suffix in _SUFFIXES:
+        if w + suffix in used:                              # dog -> dogs was played
             return True
-        if w == u + "ing" or u == w + "ing":   # run / running
+        if w.endswith(suffix) and w[:-len(suffix)] in used:  # dogs -> dog was played
             return True
     return False
@@ -20,17 +20,23 @@ starts. `train_of_thought` used to sit above `response`, so every turn generated
 tokens of animation data before writing anything the player would read.
 """
 
+from . import config
 
-def move_schema(with_train_of_thought=True):
+
+def move_schema(with_train_of_thought=True, with_candidates=None):
     """The schema for this turn.
 
     The train of thought is only rendered when the `s` toggle is on, so when it's off it
     is generated and thrown away - the single largest slice of output tokens on the turn.
     Dropping it from the schema is a real latency saving, not a cosmetic one.
+
+    `with_candidates` (default: config.CANDIDATES) adds ranked backup words, so that an
+    illegal `chosen_word` can be replaced from the same answer instead of by asking
+    again. See `_CANDIDATES`.
     """
-    if with_train_of_thought:
-        return MOVE_SCHEMA
-    return _MOVE_SCHEMA_NO_TOT
+    if with_candidates is None:
+        with_candidates = config.CANDIDATES
+    return _VARIANTS[bool(with_train_of_thought), bool(with_candidates)]
 
 
 MOVE_SCHEMA = {
@@ -110,12 +116,61 @@ MOVE_SCHEMA = {
 }
 
 
-# Same schema with the train of thought removed. Built by copy rather than written out
-# twice so the two can't drift - a duplicated description is a description that will be
-# edited in one place only.
-_MOVE_SCHEMA_NO_TOT = {
-    **MOVE_SCHEMA,
-    "properties": {k: v for k, v in MOVE_SCHEMA["properties"].items()
-                   if k != "train_of_thought"},
-    "required": [k for k in MOVE_SCHEMA["required"] if k != "train_of_thought"],
+# Backups for chosen_word, best first. The post-check used to have one answer to a
+# word that was illegal or already played: send the whole turn back with a correction
+# and wait for a second generation - twice the latency, on exactly the turns where the
+# board is crowded and the player is already waiting longest. With these the engine
+# takes the first backup that passes and only asks again if none do.
+#
+# Placed after `response`, not beside `chosen_word`: nothing reads it until the turn is
+# over, and ahead of the reply it would only delay the first character.
+_CANDIDATES = {
+    "type": "array",
+    "items": {"type": "string"},
+    "description": (
+        "Two to four other single words you would play instead of chosen_word, best "
+        "first. Each must obey the letter rule and not be in the chain - they are used, "
+        "in order, if chosen_word turns out not to be legal. Empty when you didn't play "
+        "a word."
+    ),
+}
+
+
+def _variant(train_of_thought, candidates):
+    # Built by copy rather than written out again so the variants can't drift - a
+    # duplicated description is a description that will be edited in one place only.
+    properties = {}
+    for name, spec in MOVE_SCHEMA["properties"].items():
+        if name == "train_of_thought" and not train_of_thought:
+            continue
+        properties[name] = spec
+        if name == "response" and candidates:
+            properties["candidates"] = _CANDIDATES
+    return {**MOVE_SCHEMA, "properties": properties, "required": list(properties)}
+
+
+_VARIANTS = {(t, c): _variant(t, c) for t in (True, False) for c in (True, False)}
+_VARIANTS[True, False] = MOVE_SCHEMA
+
+
+# For a turn whose outcome the engine has already decided - a rule break, a replay, the
+# clock running out - and only wants worded. Those went out with the full move schema,
+# so the model spent tokens on a code nobody reads, a their_word nobody uses and a
+# chosen_word it had been told to leave empty, sometimes with a train of thought on top,
+# all before the one line that is actually shown. These are the turns where the player
+# has just lost, and the last thing to make them do is wait.
+WORDING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "response": {
+            "type": "string",
+            "description": (
+                "What they see: one short lowercase line saying what happened, as the "
+                "note asks. Never a word played onto the board - there isn't one to "
+                "play onto."
+            ),
+        },
+    },
+    "required": ["response"],
+    "additionalProperties": False,
 }
@@ -0,0 +1,187 @@
+"""Latency quantiles, kept as they happen.
+
+The transcript has every turn's `latency_ms`, but a question like "p95 for ASK against
+OK in the last hour" means reading every row back and sorting them. The histograms in
+metrics.py are cheap but coarse: a bucket from 2.5 to 5 seconds can't tell 2.6 from 4.9.
+This keeps a small sketch per kind of turn instead, and answers from that.
+
+The sketch is DDSketch's: values go into logarithmic bins, each `ACCURACY` wide in
+relative terms, so any quantile it reports is within 1% of a value that was really
+observed - at 40ms or at 40s alike. Bins are counted, not values kept, so its size
+depends on the spread of the latencies and not on how many there were; it is capped at
+`MAX_BINS` regardless, by folding the lowest bins together, which only costs accuracy
+down among the fastest turns where nobody is looking. Two sketches merge by adding
+their bins, which is what makes windows and groupings cheap.
+
+Each kind of turn gets a ring of `SLOTS` sketches, `SLOT_S` seconds each. A slot is
+reused, emptied, when the ring comes back round to it; a window is the merge of the
+slots inside it. So memory per kind of turn is fixed - `SLOTS` sketches of at most
+`MAX_BINS` bins - however much traffic there is, and the longest window is
+`SLOTS * SLOT_S`.
+
+A kind of turn is its `Key`: solo or room, response code, provider, model, and whether
+its reply streamed to the player as it was written - which a room's bot turn never
+does. server.py serves `report` at /stats/latency.
+"""
+
+import math
+import threading
+import time
+from collections import namedtuple
+
+#: Relative accuracy of a reported quantile.
+ACCURACY = 0.01
+
+#: Most bins one sketch holds. At 1% accuracy a bin spans 2%, so 1024 of them reach
+#: from a millisecond to days before any folding happens.
+MAX_BINS = 1024
+
+#: The ring: one-minute slots, an hour of them.
+SLOT_S = 60
+SLOTS = 60
+
+#: Quantiles `report` gives for every key.
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+Key = namedtuple("Key", "kind code provider model streamed")
+
+_GAMMA = (1 + ACCURACY) / (1 - ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+class Sketch:
+    """A DDSketch over positive values. Zero and below are counted apart."""
+
+    __slots__ = ("bins", "zeros", "count", "total", "max")
+
+    def __init__(self):
+        self.bins = {}                  # index -> count; bin i covers (γ^(i-1), γ^i]
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value, n=1):
+        self.count += n
+        self.total += value * n
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zeros += n
+            return
+        i = math.ceil(math.log(value) / _LOG_GAMMA)
+        self.bins[i] = self.bins.get(i, 0) + n
+        if len(self.bins) > MAX_BINS:
+            self._fold()
+
+    def merge(self, other):
+        for i, n in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if len(self.bins) > MAX_BINS:
+            self._fold()
+        return self
+
+    def quantile(self, q):
+        """The value at quantile `q` (0..1), to within ACCURACY. None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if rank < seen:
+                # The middle of the bin, in relative terms: within ACCURACY of anything
+                # that landed in it.
+                return min(2 * _GAMMA ** i / (_GAMMA + 1), self.max)
+        return self.max
+
+    def _fold(self):
+        # Lowest bins first: the fast end is where a quantile is least often read.
+        ordered = sorted(self.bins)
+        keep = ordered[len(ordered) - MAX_BINS:]
+        folded = sum(self.bins.pop(i) for i in ordered[:len(ordered) - MAX_BINS])
+        self.bins[keep[0]] += folded
+
+
+class _Ring:
+    """`SLOTS` sketches, one per `SLOT_S`, reused in turn."""
+
+    __slots__ = ("sketches", "epochs")
+
+    def __init__(self):
+        self.sketches = [None] * SLOTS
+        self.epochs = [-1] * SLOTS        # which SLOT_S period each slot currently holds
+
+    def add(self, epoch, value):
+        i = epoch % SLOTS
+        if self.epochs[i] != epoch or self.sketches[i] is None:
+            self.sketches[i], self.epochs[i] = Sketch(), epoch
+        self.sketches[i].add(value)
+
+    def window(self, epoch, slots, into):
+        for back in range(slots):
+            i = (epoch - back) % SLOTS
+            if self.epochs[i] == epoch - back and self.sketches[i] is not None:
+                into.merge(self.sketches[i])
+        return into
+
+
+class Latencies:
+    def __init__(self, clock=time.time):
+        self._rings = {}                  # Key -> _Ring
+        self._lock = threading.Lock()
+        self._clock = clock
+
+    def observe(self, key, ms):
+        epoch = int(self._clock() // SLOT_S)
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is None:
+                ring = self._rings[key] = _Ring()
+            ring.add(epoch, ms)
+
+    def report(self, window_s=SLOTS * SLOT_S, by=Key._fields):
+        """Quantiles over the last `window_s`, one entry per distinct `by`.
+
+        `by` names the Key fields to keep apart; the rest are merged. ("code",) is every
+        response code across every provider and mode; all five is every kind of turn on
+        its own. The window is rounded up to whole slots and capped at the ring.
+        """
+        slots = max(1, min(SLOTS, math.ceil(window_s / SLOT_S)))
+        epoch = int(self._clock() // SLOT_S)
+        by = [f for f in by if f in Key._fields]
+        merged = {}
+        with self._lock:
+            for key, ring in self._rings.items():
+                group = tuple(getattr(key, f) for f in by)
+                ring.window(epoch, slots, merged.setdefault(group, Sketch()))
+        out = []
+        for group, sketch in sorted(merged.items(), key=lambda kv: str(kv[0])):
+            if not sketch.count:
+                continue
+            row = dict(zip(by, group))
+            row["count"] = sketch.count
+            row["mean_ms"] = round(sketch.total / sketch.count, 1)
+            row["max_ms"] = round(sketch.max, 1)
+            for q in QUANTILES:
+                row[f"p{round(q * 100):g}_ms"] = round(sketch.quantile(q), 1)
+            out.append(row)
+        return {"window_s": slots * SLOT_S, "by": by, "latencies": out}
+
+
+LATENCIES = Latencies()
+
+
+def observe(kind, code, provider, streamed, ms):
+    """A `kind` ("solo" or "room") turn answered `code` in `ms`, via `provider`."""
+    LATENCIES.observe(Key(kind, code or "UNKNOWN", provider.name,
+                          getattr(provider, "model", None) or "", bool(streamed)), ms)
+
+
+def report(window_s=SLOTS * SLOT_S, by=Key._fields):
+    return LATENCIES.report(window_s, by)
@@ -0,0 +1,105 @@
+"""Where a turn's time went.
+
+`latency_ms` says a turn was slow. It doesn't say whether the model was slow, whether
+the model was asked twice, or whether it was our own code - and those have different
+fixes. A `Spans` is made when a turn starts and carried to everything that spends its
+time, the same way its usage tally is (TurnContext.count):
+
+  marks   the first time something happened, in ms from the start of the turn:
+          first_event (the model's first anything), first_field, gate (the moment the
+          engine decided whether the reply could be shown) and first_delta (the first
+          text the player could have seen).
+  stages  ms spent in each part, summed over the turn: prompt (rendering it), model
+          (waiting on the provider), record (handing the rows to the transcript), and
+          checks - everything else, which is the engine's own rules and bookkeeping.
+  calls   one entry per model call, in order: how long it took and, when streamed, how
+          long until its first event. A retry is the second entry.
+
+A finished turn's breakdown goes on its transcript row and into one histogram per
+stage (`turn_<stage>_ms`), so a regression in p95 can be pinned on the stage that moved.
+`record` is the exception: the row can't hold the time it took to write itself, so that
+one is timed after `finish` and only reaches its histogram. It is the time to queue the
+rows, which is all a turn waits for; the write itself is `transcript_flush_ms`.
+
+Cheap on purpose: a handful of monotonic reads per turn and no locks - a turn's spans
+are only ever touched by the one thread running that turn.
+"""
+
+import time
+from contextlib import contextmanager
+
+from . import metrics
+
+#: The stages a turn is split into. `checks` is not timed directly; it is what is left.
+STAGES = ("prompt", "model", "checks", "record")
+
+_HISTOGRAMS = {stage: metrics.histogram(f"turn_{stage}_ms", f"ms per turn spent in {stage}")
+               for stage in STAGES}
+_TTFT = metrics.histogram("turn_first_delta_ms", "ms from a turn's start to its first text")
+
+
+class Spans:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.marks = {}
+        self.stages = {}
+        self.calls = []
+        self._finished = False
+
+    def since(self, at=None):
+        """ms from the start of the turn to `at` (now, by default)."""
+        at = time.monotonic() if at is None else at
+        return round((at - self.started) * 1000, 1)
+
+    def mark(self, name, at=None):
+        """Note that `name` happened, unless it already has this turn."""
+        if name not in self.marks:
+            self.marks[name] = self.since(at)
+
+    def add(self, stage, ms):
+        self.stages[stage] = round(self.stages.get(stage, 0) + ms, 1)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            ms = (time.monotonic() - started) * 1000
+            self.add(name, ms)
+            if self._finished and name in _HISTOGRAMS:
+                _HISTOGRAMS[name].observe(ms)
+
+    @contextmanager
+    def call(self):
+        """One model call. Timed as `model`, and listed in `calls` with its first event."""
+        entry = {"at_ms": self.since(), "ms": None, "ttft_ms": None}
+        self.calls.append(entry)
+        started = time.monotonic()
+        try:
+            yield entry
+        finally:
+            entry["ms"] = round((time.monotonic() - started) * 1000, 1)
+            self.add("model", entry["ms"])
+
+    def first_event(self, entry, at):
+        """The stream behind `entry` (from `call`) produced its first event at `at`."""
+        if entry is not None and entry["ttft_ms"] is None:
+            entry["ttft_ms"] = round(self.since(at) - entry["at_ms"], 1)
+        self.mark("first_event", at)
+
+    def finish(self, total_ms):
+        """The turn is over, after `total_ms`. Fill in `checks`, observe, return a dict."""
+        timed = sum(ms for stage, ms in self.stages.items() if stage != "checks")
+        self.stages["checks"] = round(max(total_ms - timed, 0), 1)
+        self._finished = True
+        for stage, ms in self.stages.items():
+            if stage in _HISTOGRAMS:
+                _HISTOGRAMS[stage].observe(ms)
+        if "first_delta" in self.marks:
+            _TTFT.observe(self.marks["first_delta"])
+        return self.as_dict()
+
+    def as_dict(self):
+        return {"marks": dict(self.marks), "stages": dict(self.stages),
+                "calls": [dict(c) for c in self.calls]}
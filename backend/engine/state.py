@@ -11,7 +11,7 @@ without touching the callers.
 """
 
 from .history import History
-from .rules import LetterRule
+from .rules import LetterRule, UsedWords
 
 SOLO_ID = "solo"
 
@@ -20,6 +20,15 @@ SOLO_ID = "solo"
 # this is resent on every turn.
 TRANSCRIPT_WINDOW = 40
 
+# How far the window slides when it is full. It used to drop one message per message
+# added, which moved the start of the conversation on every turn - and the start is
+# where the model provider's prompt cache begins matching, so once the window filled,
+# nothing past the system prompt was ever a cache hit again. Dropping a page at a time
+# keeps the first message put for a page's worth of turns; the window holds between
+# WINDOW - PAGE and WINDOW messages. Even, so the conversation keeps starting on the
+# same side it always did.
+TRANSCRIPT_PAGE = 10
+
 
 class Game:
     """One game's worth of state.
@@ -34,7 +43,7 @@ class Game:
 
     def __init__(self, reverse=False, history=None):
         self.chain = []                     # ordered words played, both sides
-        self.used = set()                   # lowercased words already spent
+        self.used = UsedWords()             # lowercased words already spent, indexed
         self.last_word = None               # the word the next move must relate to
         self.rule = LetterRule(reverse)     # normal or reversed letter rule
         self.history = history or History() # transcript, events, links - outlives resets
@@ -56,7 +65,8 @@ class Game:
         if not text:
             return
         self.transcript.append((role, text))
-        del self.transcript[:-TRANSCRIPT_WINDOW]
+        if len(self.transcript) > TRANSCRIPT_WINDOW:
+            del self.transcript[:TRANSCRIPT_PAGE]
 
     def set_reverse(self, reverse):
         """Flip the letter rule mid-game.
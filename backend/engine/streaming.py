@@ -12,11 +12,24 @@ nothing until the moment it no longer matters.
 Only top-level string fields are extracted, which is all the engine needs - the schema
 puts `train_of_thought`, the one nested field, last. The authoritative parse still
 happens at the end; this is for latency, not for correctness.
+
+It runs on every delta of every streamed turn, so it doesn't look at characters it has
+no use for: each state searches ahead for the few that could end it and takes the text
+in between as one slice. `bench_streaming.py` measures it against the character-at-a-
+time scanner it replaced, and checks the two agree.
 """
 
+import re
+
 _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b",
             "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
 
+# What each state is waiting for. Everything else is skipped, or taken as one run.
+_STRING_STOP = re.compile(r'["\\]')
+_NESTED_STOP = re.compile(r'["\\\[\]{}]')
+_SCALAR_STOP = re.compile(r"[,}]")
+_NOT_SPACE = re.compile(r"[^ \t\r\n]")
+
 
 class FieldReader:
     """Feed it JSON text; it reports which string fields have appeared.
@@ -37,97 +50,148 @@ class FieldReader:
         self.values = {}
 
     def feed(self, chunk):
-        pending = {}
+        field = self._field
+        if (self._state == "string" and self._hex is None and not self._escape
+                and '"' not in chunk and "\\" not in chunk):
+            # The usual delta: more of a string that doesn't end in this piece.
+            if not chunk:
+                return []
+            self.values[field] += chunk
+            return [(field, chunk, False)]
+
+        # The scanner's state lives in locals while it runs and is put back at the end;
+        # on pieces this small, attribute lookups were most of the cost.
+        state, key, escape, hex_ = self._state, self._key, self._escape, self._hex
+        values = self.values
+        pending = {}                    # field -> [runs], in the order they first spoke
         finished = []
+        i, n = 0, len(chunk)
+
+        # Each state jumps straight to the next character that could change it, and
+        # whatever it jumped over is handled as one run - a word of reply is one slice
+        # and one append, not a dozen trips round the loop.
+        while i < n:
+            if state == "string":
+                if hex_ is not None:
+                    take = chunk[i:i + 4 - len(hex_)]
+                    hex_ += take
+                    i += len(take)
+                    if len(hex_) == 4:
+                        try:
+                            text = chr(int(hex_, 16))
+                        except ValueError:
+                            text = ""     # malformed escape: drop it, keep the stream
+                        if text:
+                            pending.setdefault(field, []).append(text)
+                            values[field] += text
+                        hex_ = None
+                    continue
+                if escape:
+                    ch = chunk[i]
+                    escape, i = False, i + 1
+                    if ch == "u":
+                        hex_ = ""
+                    else:
+                        text = _ESCAPES.get(ch, ch)
+                        pending.setdefault(field, []).append(text)
+                        values[field] += text
+                    continue
+                m = _STRING_STOP.search(chunk, i)
+                j = m.start() if m else n
+                if j > i:
+                    text = chunk[i:j]
+                    pending.setdefault(field, []).append(text)
+                    values[field] += text
+                if j == n:
+                    break
+                if chunk[j] == "\\":
+                    escape = True
+                else:
+                    finished.append(field)
+                    state, field = "seek", None
+                i = j + 1
 
-        def emit(text):
-            pending[self._field] = pending.get(self._field, "") + text
-            self.values[self._field] += text
-
-        for ch in chunk:
-            state = self._state
-
-            if state == "seek":
+            elif state == "seek":
                 # Between tokens at the top level. Braces, commas and whitespace are
                 # all noise; a quote starts a key.
-                if ch == '"':
-                    self._state, self._key = "key", ""
+                j = chunk.find('"', i)
+                if j < 0:
+                    break
+                state, key, i = "key", "", j + 1
 
             elif state == "key":
-                if self._escape:
-                    self._key += _ESCAPES.get(ch, ch)
-                    self._escape = False
-                elif ch == "\\":
-                    self._escape = True
-                elif ch == '"':
-                    self._state = "colon"
+                if escape:
+                    key += _ESCAPES.get(chunk[i], chunk[i])
+                    escape, i = False, i + 1
+                    continue
+                m = _STRING_STOP.search(chunk, i)
+                j = m.start() if m else n
+                key += chunk[i:j]
+                if j == n:
+                    break
+                if chunk[j] == "\\":
+                    escape = True
                 else:
-                    self._key += ch
+                    state = "colon"
+                i = j + 1
 
             elif state == "colon":
-                if ch == ":":
-                    self._state = "value"
+                j = chunk.find(":", i)
+                if j < 0:
+                    break
+                state, i = "value", j + 1
 
             elif state == "value":
+                m = _NOT_SPACE.search(chunk, i)
+                if not m:
+                    break
+                ch, i = m.group(), m.end()
                 if ch == '"':
-                    self._state, self._field = "string", self._key
-                    self.values.setdefault(self._field, "")
+                    state, field = "string", key
+                    values.setdefault(field, "")
                 elif ch in "[{":
                     # Nested. Skipped wholesale: the engine reads nothing from inside a
                     # nested value, and descending would let a key *inside* the nesting
                     # be mistaken for a top-level one.
-                    self._state = "nested"
+                    state = "nested"
                     self._depth = 1
                     self._in_nested_string = False
-                elif ch not in " \t\r\n":
-                    self._state = "scalar"
-
-            elif state == "string":
-                if self._hex is not None:
-                    self._hex += ch
-                    if len(self._hex) == 4:
-                        try:
-                            emit(chr(int(self._hex, 16)))
-                        except ValueError:
-                            pass          # malformed escape: drop it, keep the stream
-                        self._hex = None
-                elif self._escape:
-                    self._escape = False
-                    if ch == "u":
-                        self._hex = ""
-                    else:
-                        emit(_ESCAPES.get(ch, ch))
-                elif ch == "\\":
-                    self._escape = True
-                elif ch == '"':
-                    finished.append(self._field)
-                    self._state, self._field = "seek", None
                 else:
-                    emit(ch)
+                    state = "scalar"
 
             elif state == "scalar":
-                if ch in ",}":
-                    self._state = "seek"
+                m = _SCALAR_STOP.search(chunk, i)
+                if not m:
+                    break
+                state, i = "seek", m.end()
 
             elif state == "nested":
                 # Strings inside the nesting can contain braces, so track them - a
                 # bracket in a word would otherwise unbalance the depth count.
-                if self._escape:
-                    self._escape = False
-                elif ch == "\\":
-                    self._escape = True
+                if escape:
+                    escape, i = False, i + 1
+                    continue
+                stop = _STRING_STOP if self._in_nested_string else _NESTED_STOP
+                m = stop.search(chunk, i)
+                if not m:
+                    break
+                ch, i = m.group(), m.end()
+                if ch == "\\":
+                    escape = True
                 elif self._in_nested_string:
-                    if ch == '"':
-                        self._in_nested_string = False
+                    self._in_nested_string = False
                 elif ch == '"':
                     self._in_nested_string = True
                 elif ch in "[{":
                     self._depth += 1
-                elif ch in "]}":
+                else:
                     self._depth -= 1
                     if self._depth == 0:
-                        self._state = "seek"
+                        state = "seek"
+
+        self._state, self._key, self._field = state, key, field
+        self._escape, self._hex = escape, hex_
 
-        out = [(f, d, False) for f, d in pending.items() if d]
+        out = [(f, "".join(runs), False) for f, runs in pending.items()]
         out += [(f, "", True) for f in finished]
         return out
@@ -2,7 +2,7 @@
 
 The engine keeps a game in memory and forgets it; this writes down what happened so a
 run can be read back later - which words were played, what the bot called them, how long
-each turn took, and whether a train of thought was asked for.
+each turn took and what it cost, and whether a train of thought was asked for.
 
 Two stores behind one interface, chosen by where the process is running:
 
@@ -21,21 +21,40 @@ Writing is best-effort by design: a failure here must never cost the player thei
 so every error is swallowed after being logged. A missing row is a gap in the analysis;
 a raised exception would be a lost game.
 
+Writing is also behind the turn rather than part of it. `record_turn` and
+`record_message` only put rows on a bounded queue; one writer thread drains it, groups
+what it finds by chat and writes each chat's rows in a single append - one `executemany`
+on SQLite, one transaction on Firestore. A turn used to wait on a commit, and a room held
+its lock across a whole Firestore round-trip while everyone else in it waited to type.
+When the queue is full the row is dropped and counted rather than waited for, for the
+same reason errors are swallowed: the transcript is never allowed to slow the game down.
+
   RTS_TRANSCRIPT_DB   SQLite path. Defaults to backend/transcripts.db.
                       Set it empty to turn recording off entirely.
   RTS_FIRESTORE_DB    Firestore database id. Set (and reachable) means Firestore wins.
                       Defaults to "rts-transcripts" when GOOGLE_CLOUD_PROJECT is set, which is
                       true on Cloud Run and false on a laptop.
+  RTS_TRANSCRIPT_QUEUE     rows held waiting for the writer before new ones are dropped.
+                           Defaults to 10000.
+  RTS_TRANSCRIPT_BATCH     rows that trigger a write without waiting for the interval.
+                           Defaults to 200.
+  RTS_TRANSCRIPT_FLUSH_MS  longest a row waits before it is written. Defaults to 500.
 """
 
+import atexit
+import json
 import logging
 import os
+import queue
 import sqlite3
 import threading
+import time
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
 
+from . import metrics
+
 log = logging.getLogger(__name__)
 
 # Column order shared by both stores, so a row means the same thing either way.
@@ -44,9 +63,24 @@ log = logging.getLogger(__name__)
 # solo game has exactly two participants and `role` tells them apart; a room has as
 # many as walked in, and "which human" is the question you actually want to ask of a
 # multiplayer transcript afterwards.
+#
+# The last five are what a bot row cost: how many times the turn went to the model (a
+# retry is two, a phrase-bank line is none) and the tokens those calls used, summed.
+# `latency_ms` alone says a turn was slow; these say whether it was slow because it
+# asked twice, or because it missed the cache and paid for the whole prompt. A token
+# column is null, not 0, when the provider doesn't say - the stub, or a server that
+# doesn't return usage - so "free" and "unknown" stay apart.
+#
+# `spans` is where `latency_ms` went (spans.py), as JSON text in both stores: which
+# stage, which call, and when the player first saw anything.
 FIELDS = ("message_id", "chat_id", "seq", "ts", "role", "type", "text", "word",
           "link_from", "link_to", "reverse", "new_game", "latency_ms", "thoughts",
-          "user_id", "user_name")
+          "user_id", "user_name", "model_calls", "input_tokens", "output_tokens",
+          "cache_read_tokens", "cache_write_tokens", "spans")
+
+#: Usage columns, and the TurnContext.count name each one is summed from.
+_USAGE = {"model_calls": "calls", "input_tokens": "input", "output_tokens": "output",
+          "cache_read_tokens": "cache_read", "cache_write_tokens": "cache_write"}
 
 _SQLITE_PATH = os.environ.get(
     "RTS_TRANSCRIPT_DB",
@@ -104,7 +138,13 @@ class _Sqlite:
         latency_ms  INTEGER,               -- bot rows only: how long the turn took
         thoughts    INTEGER,               -- was a train of thought asked for?
         user_id     TEXT,                  -- room rows only: which player said it
-        user_name   TEXT                   -- their display name at the time
+        user_name   TEXT,                  -- their display name at the time
+        model_calls INTEGER,               -- bot rows only: model calls the turn made
+        input_tokens       INTEGER,        -- uncached input, summed over those calls
+        output_tokens      INTEGER,
+        cache_read_tokens  INTEGER,        -- input served from the prompt cache
+        cache_write_tokens INTEGER,        -- input written to it
+        spans       TEXT                   -- bot rows only: latency_ms broken down, JSON
     );
     CREATE INDEX IF NOT EXISTS messages_by_chat ON messages(chat_id, seq);
     CREATE INDEX IF NOT EXISTS messages_by_time ON messages(ts);
@@ -134,9 +174,11 @@ class _Sqlite:
         fails against every database anyone has been collecting runs in.
         """
         have = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
-        for column in ("user_id", "user_name"):
+        added = [(c, "TEXT") for c in ("user_id", "user_name", "spans")]
+        added += [(c, "INTEGER") for c in _USAGE]
+        for column, kind in added:
             if column not in have:
-                conn.execute(f"ALTER TABLE messages ADD COLUMN {column} TEXT")
+                conn.execute(f"ALTER TABLE messages ADD COLUMN {column} {kind}")
 
     def append(self, chat_id, rows):
         with self._lock:
@@ -267,6 +309,154 @@ def enabled():
     return bool(_FIRESTORE_DB or _SQLITE_PATH)
 
 
+# ---------------------------------------------------------------------------
+# the writer
+# ---------------------------------------------------------------------------
+_QUEUE_ROWS = int(os.environ.get("RTS_TRANSCRIPT_QUEUE", "10000"))
+_BATCH_ROWS = int(os.environ.get("RTS_TRANSCRIPT_BATCH", "200"))
+_FLUSH_S = int(os.environ.get("RTS_TRANSCRIPT_FLUSH_MS", "500")) / 1000
+
+_DROPPED = metrics.counter("transcript_rows_dropped",
+                           "rows thrown away because the writer's queue was full")
+_WRITTEN = metrics.counter("transcript_rows_written", "rows handed to the store")
+_FAILED = metrics.counter("transcript_rows_failed", "rows the store refused")
+_FLUSH_MS = metrics.histogram("transcript_flush_ms", "time to write one batch")
+
+#: Put on the queue to make the writer flush now rather than at the next interval.
+_FLUSH = object()
+
+
+class _Recorder:
+    """A bounded queue and the one thread that empties it.
+
+    One writer, not a pool: `seq` is handed out at write time from whatever the store
+    already holds, so two writers on the same chat could race for a number. A single
+    thread draining a FIFO keeps every chat's rows in the order they were recorded,
+    which is the order the turn produced them in.
+
+    Items are `(chat_id, rows)`. Each is `task_done` only once its rows are written, so
+    `drain` can wait for "everything recorded so far is in the store" rather than
+    merely "the queue is empty" - a batch in the writer's hands is neither.
+    """
+
+    def __init__(self, maxsize=_QUEUE_ROWS, batch=_BATCH_ROWS, interval=_FLUSH_S):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._batch = batch
+        self._interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        metrics.gauge("transcript_queue_depth", "rows waiting for the writer",
+                      fn=self._queue.qsize)
+
+    def put(self, chat_id, rows):
+        self._start()
+        try:
+            self._queue.put_nowait((chat_id, rows))
+        except queue.Full:
+            _DROPPED.inc(len(rows))
+            log.warning("transcript queue full; dropped %d row(s) for chat %s",
+                        len(rows), chat_id)
+
+    def drain(self, timeout=5.0):
+        """Block until everything recorded so far has been written, or `timeout`."""
+        if self._thread is None:
+            return True
+        q = self._queue
+        try:
+            q.put(_FLUSH, timeout=timeout)
+        except queue.Full:
+            return False
+        deadline = time.monotonic() + timeout
+        with q.all_tasks_done:
+            while q.unfinished_tasks:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                q.all_tasks_done.wait(left)
+        return True
+
+    def stop(self, timeout=5.0):
+        """Write what's left and let the thread go. Registered to run at exit."""
+        self.drain(timeout)
+        self._stopping = True
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="transcript",
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        q = self._queue
+        while not self._stopping:
+            try:
+                first = q.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            # Gather for up to one interval, or until the batch is full, or until
+            # someone asks for a flush - whichever comes first.
+            taken = [first]
+            rows = 0 if first is _FLUSH else len(first[1])
+            deadline = time.monotonic() + self._interval
+            while taken[-1] is not _FLUSH and rows < self._batch:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    item = q.get(timeout=left)
+                except queue.Empty:
+                    break
+                taken.append(item)
+                if item is not _FLUSH:
+                    rows += len(item[1])
+
+            try:
+                self._write([item for item in taken if item is not _FLUSH])
+            finally:
+                for _ in taken:
+                    q.task_done()
+
+    @staticmethod
+    def _write(items):
+        """One append per chat, in the order each chat's rows were recorded."""
+        if not items:
+            return
+        by_chat = {}
+        for chat_id, rows in items:
+            by_chat.setdefault(chat_id, []).extend(rows)
+
+        started = time.monotonic()
+        for chat_id, rows in by_chat.items():
+            try:
+                store().append(chat_id, rows)
+                _WRITTEN.inc(len(rows))
+            except Exception:                               # noqa: BLE001
+                _FAILED.inc(len(rows))
+                log.exception("could not record %d row(s) for chat %s",
+                              len(rows), chat_id)
+        _FLUSH_MS.observe((time.monotonic() - started) * 1000)
+
+
+_RECORDER = _Recorder()
+atexit.register(_RECORDER.stop)
+
+
+def flush(timeout=5.0):
+    """Wait until every row recorded so far is in the store. True if it got there."""
+    return _RECORDER.drain(timeout)
+
+
+def stats():
+    """How the writer is keeping up: queue depth, rows written, dropped, failed, and
+    how long its writes take."""
+    return metrics.snapshot("transcript_")
+
+
 # ---------------------------------------------------------------------------
 # api
 # ---------------------------------------------------------------------------
@@ -277,19 +467,43 @@ _BLANK = {f: None for f in FIELDS}
 _BLANK["new_game"] = 0
 
 
+def _usage(usage):
+    """A turn's usage tally (TurnContext.count) as the row's usage columns.
+
+    None - a row that isn't a turn - leaves them all null. A tally with no calls in it
+    is a turn answered without the model, which is 0 calls; a token count the provider
+    never reported stays null.
+    """
+    if usage is None:
+        return {}
+    out = {column: usage.get(name) for column, name in _USAGE.items()}
+    out["model_calls"] = usage.get("calls", 0)
+    return out
+
+
+def _spans(spans):
+    return None if spans is None else json.dumps(spans, separators=(",", ":"))
+
+
 def record_message(chat_id, *, role, type, text, reverse=False, user_id=None,
-                   user_name=None, word=None, link=None, latency_ms=None):
+                   user_name=None, word=None, link=None, latency_ms=None, usage=None,
+                   spans=None):
     """Write one message.
 
     Rooms produce messages one at a time - somebody speaks, and much later somebody
     else does - where a solo game produces them strictly in pairs. Same table, same
     columns, so one query reads both kinds back; only the arrival pattern differs.
+
+    `usage` and `spans` are what the message cost and where its time went, for a bot
+    message that came from the model.
+
+    Queued, not written: this returns before the row reaches the store.
     """
     if not enabled():
         return
     try:
         link = link or {}
-        store().append(chat_id, [{
+        _RECORDER.put(chat_id, [{
             **_BLANK,
             "message_id": uuid.uuid4().hex,
             "chat_id": chat_id,
@@ -304,17 +518,20 @@ def record_message(chat_id, *, role, type, text, reverse=False, user_id=None,
             "latency_ms": latency_ms,
             "user_id": user_id,
             "user_name": user_name,
+            "spans": _spans(spans),
+            **_usage(usage),
         }])
     except Exception:                                   # noqa: BLE001
         log.exception("could not record message for chat %s", chat_id)
 
 
 def record_turn(chat_id, player_input, payload, reverse, latency_ms=None,
-                thoughts=None):
+                thoughts=None, usage=None, spans=None):
     """Write both halves of one exchange.
 
     Called from the one place that already knows a turn is over, so it can't drift out
-    of step with what the player actually saw.
+    of step with what the player actually saw. `usage` and `spans` go on the bot's
+    row - the human's cost nothing. Queued, like `record_message`.
     """
     if not enabled():
         return
@@ -337,19 +554,26 @@ def record_turn(chat_id, player_input, payload, reverse, latency_ms=None,
              "link_from": link.get("from"), "link_to": link.get("to"),
              "new_game": int(bool(payload.get("new_game"))),
              "latency_ms": latency_ms,
-             "thoughts": None if thoughts is None else int(bool(thoughts))},
+             "thoughts": None if thoughts is None else int(bool(thoughts)),
+             "spans": _spans(spans),
+             **_usage(usage)},
         ]
-        store().append(chat_id, rows)
+        _RECORDER.put(chat_id, rows)
     except Exception:                                   # noqa: BLE001
         # A recording failure is not worth a lost turn.
         log.exception("could not record turn for chat %s", chat_id)
 
 
 def chat(chat_id):
-    """Every message in one chat, in order."""
+    """Every message in one chat, in order.
+
+    Flushes first, so a turn played a moment ago is here rather than still queued.
+    """
+    flush()
     return store().chat(chat_id)
 
 
 def chats(limit=50):
     """The most recently active chats, newest first."""
+    flush()
     return store().chats(limit)
@@ -28,14 +28,31 @@ That last one is why `pending` exists.
 """
 
 import queue
-import threading
 import time
 
-from . import contract, history, prompts, rules, transcript
+from . import (cancel, contract, history, metrics, phrases, prewarm, profiler, prompts,
+               rules, sketch, transcript)
 from .preferences import Preferences
 from .providers import TurnContext, get_provider
+from .schema import WORDING_SCHEMA
 from .schema import move_schema as schema_for
+from .spans import Spans
 from .state import GAMES, SOLO_ID
+from .workers import POOL
+
+#: Seconds of silence on a streamed turn before a keep-alive goes out.
+PING_S = 2
+
+_RETRIES = metrics.counter("turn_retries",
+                           "second model calls made because the bot's word was illegal")
+_RESCUED = metrics.counter("turn_retries_avoided",
+                           "illegal bot words replaced from the move's own candidates")
+_SALVAGED = metrics.counter("turn_concedes_avoided",
+                            "illegal retried words replaced from the retry's candidates")
+_TURNS = metrics.counter("turns_played", "solo turns answered, streamed or not")
+_ERRORS = metrics.counter("turns_errored", "solo turns answered with the ERROR bubble")
+_ACTIVE = metrics.gauge("turns_active", "solo turns being played right now")
+_LATENCY = metrics.histogram("turn_latency_ms", "ms per solo turn, start to payload")
 
 
 def play_stream(player_input, game_id=SOLO_ID, reverse=False, preferences=None,
@@ -46,30 +63,50 @@ def play_stream(player_input, game_id=SOLO_ID, reverse=False, preferences=None,
     same contract dict `play` returns - so the client's handling of a finished turn is
     unchanged and only the arrival time differs.
 
-    The turn runs on a worker thread feeding a queue rather than being restructured as
-    a generator. `_play` is a decision tree with three possible model calls and several
+    The turn runs on a worker feeding a queue rather than being restructured as a
+    generator. `_play` is a decision tree with three possible model calls and several
     early returns; turning it inside out to yield from every branch would put streaming
     plumbing into every rule in the game. A queue keeps the rules readable and confines
-    the concurrency to these fifteen lines.
+    the concurrency to these fifteen lines. The worker is the shared turn pool's, so a
+    solo turn waits its turn alongside the rooms' bots rather than adding to the pile.
+
+    A ("ping", None) goes out every `PING_S` while nothing else has. It is how a closed
+    browser gets noticed: the server only learns the client has gone when a write
+    fails, and a turn still thinking writes nothing. When it does go, closing this
+    generator cancels the turn and stops the model mid-generation (cancel.py) - an
+    answer with nobody to read it is not recorded and not remembered.
     """
     events = queue.Queue()
-    sink = Sink(lambda text: events.put(("delta", text)), thoughts=thoughts)
+    token = cancel.Token()
+    sink = Sink(lambda text: events.put(("delta", text)), thoughts=thoughts, cancel=token)
 
     def run():
         try:
             events.put(("done", play(player_input, game_id, reverse, preferences, sink)))
+        except cancel.Cancelled:
+            pass
         except Exception as e:                      # noqa: BLE001 - the client gets "?"
             events.put(("done", contract.error(e)))
         finally:
             events.put(None)
 
-    threading.Thread(target=run, daemon=True).start()
+    POOL.submit(profiler.tagged("stream", run))
 
-    while True:
-        item = events.get()
-        if item is None:
-            return
-        yield item
+    finished = False
+    try:
+        while True:
+            try:
+                item = events.get(timeout=PING_S)
+            except queue.Empty:
+                yield "ping", None
+                continue
+            if item is None:
+                finished = True
+                return
+            yield item
+    finally:
+        if not finished:
+            token.cancel("client went away")
 
 
 def play(player_input, game_id=SOLO_ID, reverse=False, preferences=None, sink=None):
@@ -80,9 +117,18 @@ def play(player_input, game_id=SOLO_ID, reverse=False, preferences=None, sink=No
     would send it twice. A loss or restart mid-turn swaps the Game object, hence the
     re-fetch - the transcript survives that swap, the board doesn't.
     """
-    started = time.monotonic()
-    payload = _play(player_input, game_id, reverse, preferences, sink)
+    spans = Spans()
+    started = spans.started
+    usage = {}
+    with _ACTIVE.track():
+        payload = _play(player_input, game_id, reverse, preferences, sink, usage, spans)
     elapsed_ms = int((time.monotonic() - started) * 1000)
+    _TURNS.inc()
+    _LATENCY.observe(elapsed_ms)
+    sketch.observe("solo", payload.get("response_code"), get_provider(), sink is not None,
+                   elapsed_ms)
+    if payload.get("response_code") == "ERROR":
+        _ERRORS.inc()
 
     game = GAMES.get(game_id)
     game.remember("user", (player_input or "").strip())
@@ -92,9 +138,12 @@ def play(player_input, game_id=SOLO_ID, reverse=False, preferences=None, sink=No
     # is definitely over and its shape is final - _play has several early returns and
     # can call the model three times, and recording from in there would either miss
     # branches or log turns that were then replaced by a retry.
-    transcript.record_turn(game_id, player_input, payload,
-                           reverse=game.rule.reverse, latency_ms=elapsed_ms,
-                           thoughts=sink.thoughts if sink else None)
+    breakdown = spans.finish(spans.since())
+    with spans.stage("record"):
+        transcript.record_turn(game_id, player_input, payload,
+                               reverse=game.rule.reverse, latency_ms=elapsed_ms,
+                               thoughts=sink.thoughts if sink else None, usage=usage,
+                               spans=breakdown)
 
     # Along for the ride, deliberately unmentioned. The bot never brings the score up and
     # nothing is obliged to render it - but it's tracked from the first turn, so whatever
@@ -106,10 +155,14 @@ def play(player_input, game_id=SOLO_ID, reverse=False, preferences=None, sink=No
     # connect to, so there is nothing to be slow about. Decided here rather than
     # inferred from the reply text, which is the model's prose and not a fact.
     payload["opening"] = game.last_word is None
+
+    if sink is not None and sink.first_at is not None:
+        prewarm.observe(game_id, (sink.first_at - started) * 1000)
+    prewarm.after(game_id, game, usage, thoughts=sink.thoughts if sink else True)
     return payload
 
 
-def _play(player_input, game_id, reverse, preferences, sink=None):
+def _play(player_input, game_id, reverse, preferences, sink=None, usage=None, spans=None):
     game = GAMES.get(game_id)
     taste = Preferences.from_payload(preferences)
 
@@ -161,20 +214,27 @@ def _play(player_input, game_id, reverse, preferences, sink=None):
                 "so THEY LOST this round and YOU WON it. Name the letter and say the "
                 "round went to you - not to them - then ask if they want another game "
                 "and stop there. Do NOT play a word: the board is wiped and it is theirs "
-                "to open. Leave chosen_word empty. One short lowercase line.")
+                "to open. One short lowercase line.")
     elif repeated:
         note = (f'"{text.lower()}" is already in the chain, so THEY LOST this round and '
                 "YOU WON it. Say so - the round went to you, not to them - then ask if "
                 "they want another game and stop there. Do NOT play a word: the board is "
-                "wiped and it is theirs to open. Leave chosen_word empty. One short "
-                "lowercase line.")
-
-    try:
-        if sink:
-            sink.gate = lambda fields: _will_stand(fields, rule, spent, game)
-        data = _ask(game, text, taste=taste, spent=spent, correction=note, sink=sink)
-    except Exception as e:
-        return contract.error(e)                    # frontend already renders "?" on ERROR
+                "wiped and it is theirs to open. One short lowercase line.")
+
+    # With a note the outcome is already settled and only its wording is wanted, so
+    # the model is asked for that and nothing else - or, where config.PHRASES says so,
+    # isn't asked at all (phrases.py).
+    outcome = "rule_break" if broke_rule else "repeat" if repeated else None
+    if outcome and phrases.enabled(outcome):
+        data = {"response": phrases.line(outcome, game.history, rule, text)}
+    else:
+        try:
+            if sink:
+                sink.gate = lambda fields: _will_stand(fields, rule, spent, game)
+            data = _ask(game, text, taste=taste, spent=spent, correction=note, sink=sink,
+                        schema=WORDING_SCHEMA if note else None, usage=usage, spans=spans)
+        except Exception as e:
+            return contract.error(e)                # frontend already renders "?" on ERROR
 
     code = data.get("response_code", "INVALID")
     reply = (data.get("response") or "").strip()
@@ -217,7 +277,8 @@ def _play(player_input, game_id, reverse, preferences, sink=None):
                         correction="that word has NOT been played. A different word that "
                                    "happens to mean something similar is NOT a repeat - "
                                    "only the same word, or a plural/tense of it, is. "
-                                   "Accept the move and play on.")
+                                   "Accept the move and play on.",
+                        usage=usage, spans=spans)
         except Exception as e:
             return contract.error(e)
         code = data.get("response_code", "INVALID")
@@ -273,10 +334,21 @@ def _play(player_input, game_id, reverse, preferences, sink=None):
     if code == "OK":
         chosen = _clean(data.get("chosen_word"))
 
+        # A move asked for with candidates carries its own backups, best first. Taking
+        # one is a retry without the round-trip; the reply was written for the word
+        # that failed, so it goes too, and the backup is played on its own.
+        backup = "" if _legal(chosen, rule, spent) else \
+            rules.first_legal(data.get("candidates"), rule, spent)
+        if backup:
+            _RESCUED.inc()
+            chosen, reply = backup, backup
+
         if not _legal(chosen, rule, spent):
+            _RETRIES.inc()
             try:
                 data = _ask(game, text, correction="you played an illegal or repeated word",
-                            taste=taste, spent=spent, sink=_ungated(sink))
+                            taste=taste, spent=spent, sink=_ungated(sink), usage=usage,
+                            spans=spans)
             except Exception as e:
                 return contract.error(e)
             code = data.get("response_code", "CONCEDE")
@@ -284,8 +356,14 @@ def _play(player_input, game_id, reverse, preferences, sink=None):
             chosen = _clean(data.get("chosen_word"))
 
             if code != "OK" or not _legal(chosen, rule, spent):
-                # Cornered even after a retry. The AI loses; new game.
-                return _lose(game_id, rule, "CONCEDE", "ok, you got me. new game - you start")
+                chosen = rules.first_legal(data.get("candidates"), rule, spent)
+                if code != "OK" or not chosen:
+                    # Cornered even after a retry. The AI loses; new game.
+                    return _lose(game_id, rule, "CONCEDE",
+                                 "ok, you got me. new game - you start")
+                # Too late to avoid the retry - this one saved the round instead.
+                _SALVAGED.inc()
+                reply = chosen
 
         # --- 4. legal both ways: advance the chain ---
         # What they *played*, not what they typed. Falls back to the raw text only when
@@ -359,7 +437,8 @@ def timeout(game_id=SOLO_ID, reverse=False, who="human"):
         GAMES.get(game_id).remember("assistant", payload["response"])
         payload["score"] = history.score(GAMES.get(game_id).history, "human")
         payload["opening"] = GAMES.get(game_id).last_word is None
-        transcript.record_turn(game_id, "(bot timed out)", payload, reverse=rule.reverse)
+        transcript.record_turn(game_id, "(bot timed out)", payload, reverse=rule.reverse,
+                               usage={})
         return payload
 
     game.history.record(history.CONCEDED, "human", game.last_word, history.TIMED_OUT)
@@ -372,12 +451,17 @@ def timeout(game_id=SOLO_ID, reverse=False, who="human"):
             "WON it. Say the time is up and that the round went to you - not to them - "
             "then ask if they want another game and stop there. Do NOT play a word: the "
             "board is wiped and it is theirs to open, and barging in with one answers a "
-            "question you just asked. Leave chosen_word empty. One short lowercase line.")
-    try:
-        data = _ask(game, "(no answer - the clock ran out)",
-                    correction=note, spent=game.used)
-    except Exception:                                   # noqa: BLE001
-        data = {}
+            "question you just asked. One short lowercase line.")
+    usage = {}
+    if phrases.enabled("timeout"):
+        data = {"response": phrases.line("timeout", game.history)}
+    else:
+        try:
+            data = _ask(game, "(no answer - the clock ran out)",
+                        correction=note, spent=game.used, schema=WORDING_SCHEMA,
+                        usage=usage)
+        except Exception:                               # noqa: BLE001
+            data = {}
 
     # Board wiped, nothing played onto it. Whoever moves next decides how the game
     # starts: a word opens it, "yes" hands the opening to the bot - and both of those
@@ -394,7 +478,8 @@ def timeout(game_id=SOLO_ID, reverse=False, who="human"):
     game.remember("assistant", payload.get("response", ""))
     payload["score"] = history.score(game.history, "human")
     payload["opening"] = game.last_word is None
-    transcript.record_turn(game_id, "(timed out)", payload, reverse=rule.reverse)
+    transcript.record_turn(game_id, "(timed out)", payload, reverse=rule.reverse,
+                           usage=usage)
     return payload
 
 
@@ -455,19 +540,28 @@ def _settle_pending(game, data, text, code):
     game.pending = None
 
 
-def _ask(game, player_input, correction=None, taste=None, spent=None, sink=None):
+def _ask(game, player_input, correction=None, taste=None, spent=None, sink=None,
+         schema=None, usage=None, spans=None):
     # `spent` = used words plus the human's pending word, so a provider can avoid
-    # echoing it back rather than being caught by the post-check.
-    ctx = TurnContext(game.rule, spent or game.used, game.chain, game.last_word)
+    # echoing it back rather than being caught by the post-check. `schema` overrides
+    # the move schema for a turn that only needs part of a move (WORDING_SCHEMA).
+    # `usage` collects what the call cost, across every call the turn makes, and
+    # `spans` how long it took (spans.py).
+    spans = spans if spans is not None else Spans()
+    ctx = TurnContext(game.rule, spent or game.used, game.chain, game.last_word,
+                      cancel=sink.cancel if sink else None, usage=usage)
+    ctx.count(calls=1)
     provider = get_provider()
-    system = prompts.system_prompt(game.rule)
-    conversation = prompts.messages(game, player_input, correction, taste)
-
-    if sink is None:
-        return provider.move(system, conversation, ctx)
+    with spans.stage("prompt"):
+        system = prompts.system_prompt(game.rule)
+        conversation = prompts.messages(game, player_input, correction, taste)
 
-    schema = schema_for(with_train_of_thought=sink.thoughts)
-    return sink.consume(provider.stream_move(system, conversation, ctx, schema))
+    with spans.call() as call:
+        if sink is None:
+            return provider.move(system, conversation, ctx, schema=schema or schema_for())
+        schema = schema or schema_for(with_train_of_thought=sink.thoughts)
+        return sink.consume(provider.stream_move(system, conversation, ctx, schema),
+                            spans, call)
 
 
 class Sink:
@@ -481,28 +575,54 @@ class Sink:
     `their_word` and `chosen_word` ahead of `response`: by the time the first character
     of the reply exists, the engine already knows the word it is about to play. A
     rejected answer is swallowed whole and the retry streams in its place.
+
+    `cancel`, when given, is the turn's cancel.Token: once it is cancelled, `consume`
+    stops the provider's stream and raises `Cancelled`. `first_at` is when the first
+    event of the turn's first call arrived - its time to first token. The rest of the
+    stream's milestones go to the turn's spans, when `consume` is handed them.
     """
 
-    def __init__(self, emit, thoughts=True):
+    def __init__(self, emit, thoughts=True, cancel=None):
         self.emit = emit
         self.thoughts = thoughts
         self.gate = None
+        self.cancel = cancel
+        self.first_at = None
         self._open = None
 
-    def consume(self, events):
-        """Drain a provider stream and return the finished move."""
+    def consume(self, events, spans=None, call=None):
+        """Drain a provider stream and return the finished move.
+
+        `spans` and `call` are the turn's Spans and this call's entry in it: the first
+        event, first field, gate decision and first shown delta are marked there.
+        """
         self._open = None
         fields, data = {}, None
+        if self.cancel is not None:
+            events = cancel.guard(events, self.cancel)
 
+        first = True
         for kind, payload in events:
+            if first:
+                first, now = False, time.monotonic()
+                if self.first_at is None:
+                    self.first_at = now
+                if spans is not None:
+                    spans.first_event(call, now)
             if kind == "field":
                 name, value = payload
                 fields[name] = value
+                if spans is not None:
+                    spans.mark("first_field")
             elif kind == "delta":
                 if self._open is None:
                     self._open = self.gate is None or bool(self.gate(fields))
+                    if spans is not None:
+                        spans.mark("gate")
                 if self._open:
                     self.emit(payload)
+                    if spans is not None:
+                        spans.mark("first_delta")
             elif kind == "done":
                 data = payload
 
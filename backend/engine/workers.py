@@ -0,0 +1,105 @@
+"""Where model-backed turns run.
+
+A bot turn in a room and a streamed solo turn both wait seconds on a model, so neither
+runs on the thread that asked for it. Each used to get a thread of its own, which meant
+a burst of activity put as many model calls in flight as there were rooms: everybody's
+bot slowed down at once, and the ones that slowed past their clock timed out.
+
+One bounded pool instead, `config.MODEL_WORKERS` wide. When it is full, turns wait -
+ordered by deadline rather than arrival, so the bot whose clock runs out soonest gets
+the next free worker. Under FIFO a spike makes everyone late together; earliest-
+deadline-first is the order in which the most of them still make it.
+
+Deadlines are wall-clock seconds, the same units as `Room.deadline`, so a room's turn
+and a solo turn queue against each other fairly. A turn with no clock of its own is
+given one `TURN_S` from when it was submitted: nobody is counting it down, but somebody
+is still watching a typing indicator.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from . import config, metrics
+from .cancel import Cancelled
+from .rooms import TURN_S
+
+log = logging.getLogger(__name__)
+
+_WAIT_MS = metrics.histogram("workers_queue_wait_ms",
+                             "time a model-backed turn waited for a free worker")
+_LATE = metrics.counter("workers_started_late",
+                        "turns that only got a worker after their deadline had passed")
+
+
+class Pool:
+    def __init__(self, size, name="turn"):
+        self._size = max(1, size)
+        self._name = name
+        self._heap = []                         # (deadline, tiebreak, queued_at, fn, args)
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._idle = 0
+        self._starting = 0                      # spawned, not yet waiting in _take
+        self.busy = 0
+
+    def submit(self, fn, *args, deadline=None):
+        """Run `fn(*args)` on a worker, ahead of anything with a later deadline."""
+        now = time.time()
+        entry = (deadline or now + TURN_S, next(self._order), time.monotonic(), fn, args)
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._idle:
+                self._cond.notify()
+            # Spawn on outstanding work, not on "nobody idle". A worker that has been
+            # notified but hasn't woken yet still counts as idle, and a second submit in
+            # that window used to spawn nothing - leaving its turn queued behind a running
+            # one with the pool below size, which is the wait this pool exists to remove.
+            if (len(self._heap) > self._idle + self._starting
+                    and len(self._threads) < self._size):
+                worker = threading.Thread(target=self._run, daemon=True,
+                                          name=f"{self._name}-{len(self._threads)}")
+                self._threads.append(worker)
+                self._starting += 1
+                worker.start()
+
+    def queued(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _take(self, first=False):
+        with self._cond:
+            if first:
+                self._starting -= 1
+            self._idle += 1
+            self._cond.wait_for(lambda: self._heap)
+            self._idle -= 1
+            self.busy += 1
+            return heapq.heappop(self._heap)
+
+    def _run(self):
+        first = True
+        while True:
+            deadline, _, queued_at, fn, args = self._take(first)
+            first = False
+            _WAIT_MS.observe((time.monotonic() - queued_at) * 1000)
+            if time.time() > deadline:
+                _LATE.inc()
+            try:
+                fn(*args)
+            except Cancelled:
+                pass
+            except Exception:                               # noqa: BLE001
+                log.exception("turn %r failed", fn)
+            finally:
+                with self._cond:
+                    self.busy -= 1
+
+
+POOL = Pool(config.MODEL_WORKERS)
+
+metrics.gauge("workers_queued", "model-backed turns waiting for a worker", fn=POOL.queued)
+metrics.gauge("workers_busy", "model-backed turns running now", fn=lambda: POOL.busy)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+"""How the one process holds up under a crowd of rooms.
+
+    cd backend && venv/bin/python loadtest.py                       # 20 rooms, 2 each, 60s
+    venv/bin/python loadtest.py --rooms 200 --players 2 --duration 120
+    venv/bin/python loadtest.py --url http://localhost:5001 --token ...   # already running
+
+Production is one gunicorn process with 32 threads (Procfile), and every room anybody
+has open holds one of those threads for as long as it is open. What that means at 200
+rooms and a few hundred browsers isn't something to reason about; this goes and looks.
+
+It starts gunicorn on a free local port, with the flags the Procfile uses and the
+simulated provider (RTS_PROVIDER=sim - a model's pace, no network), and then behaves
+like the crowd: creates the rooms, joins the players, holds one
+`/rooms/<id>/events` stream open per player, and has each player answer with a word a
+little while after the room says it's their turn. `--chat` adds conversation on top,
+which costs nothing in turns and everything in fan-out.
+
+What it reports:
+
+  says       requests made and how long the server took to accept them
+  fan-out    from a message being posted to it arriving at each stream, per frame
+  bot turns  from the move that handed the bot its go to the bot's answer - queueing
+             for a worker included, which is the part that grows under load
+  server     peaks of the numbers /metrics reports (threads, busy handlers, model
+             calls out, turns queued) and of the process's resident memory
+
+Times are read off the server's own clock (a message carries `ts`) on the same machine,
+so no clock skew gets into them. Nothing is recorded to a transcript unless `--record`.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+HERE = Path(__file__).resolve().parent
+BOT_ID = "bot"
+
+#: What a kept-alive connection the server has since closed fails with.
+_STALE = (BrokenPipeError, ConnectionResetError, http.client.RemoteDisconnected)
+
+_ONSETS = "b c d f g h k l m n p v w z bl cl fl gl pl br cr dr gr pr".split()
+_VOWELS = "a e i o u ai ea oo ou".split()
+
+
+class Stats:
+    """Everything measured, from every thread, behind one lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.say_ms, self.fanout_ms, self.bot_ms = [], [], []
+        self.say_failed = 0
+        self.frames = 0
+        self.streams_open = 0
+        self.stream_failures = 0
+        self.peaks = {}
+
+    def add(self, name, value):
+        with self.lock:
+            getattr(self, name).append(value)
+
+    def bump(self, name, n=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def peak(self, name, value):
+        if value is None:
+            return
+        with self.lock:
+            self.peaks[name] = max(self.peaks.get(name, value), value)
+
+
+class Server:
+    """The gunicorn under test, or the address of one somebody else started."""
+
+    def __init__(self, url=None, threads=32, record=False):
+        self.proc = None
+        if url:
+            self.url = url.rstrip("/")
+            return
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        env = {**os.environ, "RTS_PROVIDER": os.environ.get("RTS_PROVIDER", "sim")}
+        if not record:
+            env["RTS_TRANSCRIPT_DB"] = ""
+            env.pop("RTS_FIRESTORE_DB", None)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}",
+             "--workers", "1", "--threads", str(threads), "--timeout", "0",
+             "--log-level", "warning", "server:app"],
+            cwd=HERE, env=env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                request(self.url, "GET", "/")
+                return
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise SystemExit("gunicorn didn't come up")
+
+    def worker_pid(self):
+        """The worker's pid - gunicorn's master only supervises it. Linux only."""
+        if self.proc is None:
+            return None
+        try:
+            children = Path(f"/proc/{self.proc.pid}/task/{self.proc.pid}/children")
+            return int(children.read_text().split()[0])
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+def request(url, method, path, body=None, conn=None, timeout=30):
+    """One request, on `conn` if given (kept alive) or a fresh connection."""
+    own = conn is None
+    if own:
+        parts = urlsplit(url)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    try:
+        data = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, body=data,
+                     headers={"Content-Type": "application/json"} if data else {})
+        resp = conn.getresponse()
+        payload = resp.read()
+        if resp.status >= 400:
+            raise OSError(f"{method} {path}: {resp.status} {payload[:200]!r}")
+        return json.loads(payload) if payload[:1] in (b"{", b"[") else payload
+    finally:
+        if own:
+            conn.close()
+
+
+class Player:
+    """One person in one room: a stream held open, and a word when it's their go."""
+
+    def __init__(self, server, stats, room_id, user_id, args, primary):
+        self.server, self.stats, self.args = server, stats, args
+        self.room_id, self.user_id = room_id, user_id
+        self.primary = primary          # one per room measures the bot's turns
+        self.rng = random.Random(user_id)
+        self.my_turn = threading.Event()
+        self.stopping = threading.Event()
+        self.sock = None
+        self.last_move_ts = None        # server ts of the last human move seen
+        self.handed_at = None           # ...as of the moment the bot got its go
+
+    def start(self):
+        threading.Thread(target=self.listen, daemon=True).start()
+        threading.Thread(target=self.play, daemon=True).start()
+        if self.args.chat:
+            threading.Thread(target=self.chat, daemon=True).start()
+
+    def stop(self):
+        self.stopping.set()
+        self.my_turn.set()
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # --- the stream -------------------------------------------------------------
+    def listen(self):
+        parts = urlsplit(self.server.url)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=None)
+        try:
+            conn.request("GET", f"/rooms/{self.room_id}/events")
+            resp = conn.getresponse()
+            self.sock = conn.sock
+            self.stats.bump("streams_open")
+            kind = None
+            for raw in resp:
+                line = raw.decode("utf-8").rstrip("\n")
+                if line.startswith("event: "):
+                    kind = line[7:]
+                elif line.startswith("data: ") and kind:
+                    self.on_event(kind, json.loads(line[6:]))
+                    kind = None
+        except (OSError, ValueError, http.client.HTTPException):
+            if not self.stopping.is_set():
+                self.stats.bump("stream_failures")
+        finally:
+            conn.close()
+
+    def on_event(self, kind, data):
+        now = time.time()
+        if kind == "message":
+            self.stats.bump("frames")
+            self.stats.add("fanout_ms", (now - data["ts"]) * 1000)
+            if data.get("kind") == "say" and data.get("flag") is None:
+                self.last_move_ts = data["ts"]
+            if self.primary and data.get("kind") == "bot" and data.get("code") \
+                    and self.handed_at is not None:
+                self.stats.add("bot_ms", (data["ts"] - self.handed_at) * 1000)
+                self.handed_at = None
+        elif kind == "state":
+            if data.get("turn") == self.user_id:
+                self.my_turn.set()
+            elif data.get("turn") == BOT_ID and self.handed_at is None:
+                self.handed_at = self.last_move_ts
+
+    # --- saying things ----------------------------------------------------------
+    def play(self):
+        conn = self._conn()
+        while not self.stopping.is_set():
+            self.my_turn.wait()
+            self.my_turn.clear()
+            if self.stopping.wait(self.rng.expovariate(1 / self.args.think)):
+                return
+            self.say(conn, self.word())
+
+    def chat(self):
+        conn = self._conn()
+        mean = 60 / self.args.chat
+        while not self.stopping.wait(self.rng.expovariate(1 / mean)):
+            self.say(conn, "ha, nice one")
+
+    def say(self, conn, text):
+        body = {"user_id": self.user_id, "message": text}
+        path = f"/rooms/{self.room_id}/say"
+        started = time.monotonic()
+        try:
+            try:
+                request(self.server.url, "POST", path, body, conn=conn)
+            except _STALE:
+                # Gunicorn closes a kept-alive connection after a couple of idle
+                # seconds, and a player thinking for longer finds out on the next send.
+                # That is the client's housekeeping, not the server failing; once more,
+                # on a new connection.
+                conn.close()
+                started = time.monotonic()
+                request(self.server.url, "POST", path, body, conn=conn)
+            self.stats.add("say_ms", (time.monotonic() - started) * 1000)
+        except (OSError, http.client.HTTPException):
+            self.stats.bump("say_failed")
+            conn.close()
+
+    def word(self):
+        # Never r, t or s first, and long enough that two players won't collide.
+        return "".join(self.rng.choice(_ONSETS) + self.rng.choice(_VOWELS)
+                       for _ in range(3))
+
+    def _conn(self):
+        parts = urlsplit(self.server.url)
+        return http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+
+
+def watch(server, stats, token, stopping, every=1.0):
+    """Peaks of the server's own numbers, read off /metrics, and of its memory."""
+    path = "/metrics" + (f"?token={token}" if token else "")
+    wanted = {"rts_process_threads": "threads", "rts_http_handlers_busy": "handlers busy",
+              "rts_model_calls_inflight": "model calls out",
+              "rts_workers_queued": "turns queued",
+              "rts_sse_room_streams_open": "room streams"}
+    pid = server.worker_pid()
+    while not stopping.wait(every):
+        try:
+            text = request(server.url, "GET", path, timeout=10).decode()
+        except (OSError, http.client.HTTPException):
+            continue
+        for line in text.splitlines():
+            name, _, value = line.partition(" ")
+            if name in wanted:
+                stats.peak(wanted[name], float(value))
+        if pid:
+            try:
+                for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                    if line.startswith("VmRSS:"):
+                        stats.peak("rss MB", int(line.split()[1]) / 1024)
+            except OSError:
+                pid = None
+
+
+def quantiles(values):
+    if not values:
+        return "-"
+    values = sorted(values)
+    at = lambda q: values[min(len(values) - 1, int(q * len(values)))]   # noqa: E731
+    return (f"p50 {at(0.5):7.1f}  p95 {at(0.95):7.1f}  p99 {at(0.99):7.1f}"
+            f"  max {values[-1]:7.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rooms", type=int, default=20)
+    ap.add_argument("--players", type=int, default=2, help="per room")
+    ap.add_argument("--duration", type=float, default=60, help="seconds, after setup")
+    ap.add_argument("--think", type=float, default=2.0,
+                    help="mean seconds a player takes to answer once it's their go")
+    ap.add_argument("--chat", type=float, default=0,
+                    help="chat messages per player per minute, on top of moves")
+    ap.add_argument("--threads", type=int, default=32, help="gunicorn --threads")
+    ap.add_argument("--url", help="test a server that is already running instead")
+    ap.add_argument("--token", default=os.environ.get("RTS_TRANSCRIPT_TOKEN", ""),
+                    help="for /metrics, if the server is gated")
+    ap.add_argument("--record", action="store_true", help="write transcripts as usual")
+    args = ap.parse_args()
+
+    server = Server(args.url, args.threads, args.record)
+    stats = Stats()
+    stopping = threading.Event()
+    players = []
+    try:
+        started = time.monotonic()
+        for r in range(args.rooms):
+            host = f"load-{r}-0"
+            room = request(server.url, "POST", "/rooms",
+                           {"user_id": host, "name": f"p{r}a", "room_name": f"load {r}",
+                            "timer": False})["room"]
+            ids = [host] + [f"load-{r}-{p}" for p in range(1, args.players)]
+            for p, user_id in enumerate(ids):
+                if p:
+                    request(server.url, "POST", f"/rooms/{room['id']}/join",
+                            {"user_id": user_id, "name": f"p{r}{chr(97 + p)}"})
+                players.append(Player(server, stats, room["id"], user_id, args, p == 0))
+        for player in players:
+            player.start()
+        setup = time.monotonic() - started
+        print(f"{args.rooms} rooms, {len(players)} players set up in {setup:.1f}s "
+              f"against {server.url}; running {args.duration:g}s", flush=True)
+
+        threading.Thread(target=watch, args=(server, stats, args.token, stopping),
+                         daemon=True).start()
+        time.sleep(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopping.set()
+        for player in players:
+            player.stop()
+        server.stop()
+
+    n = max(args.duration, 1e-9)
+    print()
+    print(f"streams    {stats.streams_open} opened, {stats.stream_failures} failed")
+    print(f"says       {len(stats.say_ms)} ok, {stats.say_failed} failed, "
+          f"{len(stats.say_ms) / n:.1f}/s   {quantiles(stats.say_ms)}")
+    print(f"fan-out    {stats.frames} frames, {stats.frames / n:.1f}/s   "
+          f"{quantiles(stats.fanout_ms)}")
+    print(f"bot turns  {len(stats.bot_ms)}, {len(stats.bot_ms) / n:.1f}/s   "
+          f"{quantiles(stats.bot_ms)}")
+    print("server     " + ", ".join(f"{k} {v:.0f}" for k, v in sorted(stats.peaks.items()))
+          + " (peaks)")
+
+
+if __name__ == "__main__":
+    main()
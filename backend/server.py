@@ -9,8 +9,8 @@ never disagree about which rule is in force. It defaults to false, which is the
 original game.
 """
 
-import json
 import os
+import threading
 from queue import Empty
 
 from dotenv import load_dotenv
@@ -33,7 +33,9 @@ if not os.environ.get("ANTHROPIC_API_KEY") and os.environ.get("GOOGLE_CLOUD_PROJ
     )
 
 import engine  # noqa: E402  (import after the key is in env so the client sees it)
-from engine import bus, transcript  # noqa: E402
+from engine import bus, metrics, profiler, prompts, sketch, transcript  # noqa: E402
+
+prompts.preload()   # the first turn shouldn't be the one that reads the prompt files
 
 app = Flask(__name__)
 
@@ -47,10 +49,36 @@ CORS(app, resources={r"/*": {
                 r"http://localhost:\d+",
                 r"http://127\.0\.0\.1:\d+"],
     "methods": ["GET", "POST", "OPTIONS"],
-    "allow_headers": ["Content-Type"],
+    "allow_headers": ["Content-Type", "Last-Event-ID"],
 }})
 
 
+# What /metrics reports about the server itself. Gunicorn runs one process with 32
+# threads (Procfile), and every one of these holds a thread while it lasts: an ordinary
+# request until it returns, a stream until it closes. `http_handlers_busy` is their sum -
+# how close the one instance is to having no thread left for the next request.
+_REQUESTS = metrics.gauge("http_requests_inflight",
+                          "requests being handled right now, streams not included")
+_TURN_STREAMS = metrics.gauge("sse_turn_streams_open", "/stream responses still open")
+_ROOM_STREAMS = metrics.gauge("sse_room_streams_open", "room event streams still open")
+metrics.gauge("http_handlers_busy", "threads held by a request or an open stream",
+              fn=lambda: _REQUESTS.value + _TURN_STREAMS.value + _ROOM_STREAMS.value)
+metrics.gauge("process_threads", "live threads in the process, every pool included",
+              fn=threading.active_count)
+
+
+@app.before_request
+def _started():
+    _REQUESTS.inc()
+
+
+@app.teardown_request
+def _finished(_error=None):
+    # Runs when the view returns - for a streamed response that is before the stream,
+    # which the two stream gauges count instead.
+    _REQUESTS.dec()
+
+
 @app.route("/")
 def home():
     return "welcome to the rts brain!"
@@ -66,12 +94,13 @@ def _game_id(data):
 @app.route("/echo", methods=["POST"])
 def echo():
     data = request.get_json(silent=True) or {}
-    return jsonify(engine.play(
-        data.get("message", ""),
-        game_id=_game_id(data),
-        reverse=bool(data.get("reverse", False)),
-        preferences=data.get("preferences"),
-    )), 200
+    with profiler.tag("echo"):
+        return jsonify(engine.play(
+            data.get("message", ""),
+            game_id=_game_id(data),
+            reverse=bool(data.get("reverse", False)),
+            preferences=data.get("preferences"),
+        )), 200
 
 
 @app.route("/stream", methods=["POST"])
@@ -100,8 +129,12 @@ def stream():
     )
 
     def events():
-        for kind, payload in turn:
-            yield f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+        with _TURN_STREAMS.track(), profiler.tag("stream"):
+            for kind, payload in turn:
+                # A ping is a comment line: the client ignores it, and writing it is how
+                # a closed tab gets noticed and its turn cancelled while the model is
+                # thinking.
+                yield bus.PING if kind == "ping" else bus.frame(kind, payload)
 
     return Response(events(), mimetype="text/event-stream", headers={
         "Cache-Control": "no-cache",
@@ -263,24 +296,38 @@ def rooms_events(room_id):
     The stream opens with the room's current state so a client that has just connected
     is never drawing a room from before it arrived, and heartbeats every 20 seconds so
     an idle room's connection isn't dropped by something in the middle.
+
+    A reconnecting browser sends `Last-Event-ID` on its own, and gets back only what
+    it missed - no opening state, since its last one is still current unless a newer
+    one is among the missed frames. When the gap can't be replayed it gets the state
+    and a `resync` instead, and reloads the room. A client too far behind to keep is
+    cut loose and comes back through the same door (see bus.py).
     """
     room, missing = _room_or_404(room_id)
     if missing:
         return missing
+    last_event_id = request.headers.get("Last-Event-ID")
 
     def events():
-        queue = bus.BUS.subscribe(room_id)
+        sub = bus.BUS.subscribe(room_id, last_event_id)
         try:
-            yield f"event: state\ndata: {json.dumps(room.state())}\n\n"
-            while True:
-                try:
-                    kind, payload = queue.get(timeout=20)
-                except Empty:
-                    yield ": ping\n\n"
-                    continue
-                yield f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+            with _ROOM_STREAMS.track(), profiler.tag("sse"):
+                if not sub.resumed:
+                    yield bus.frame("state", room.state(), event_id=sub.cursor)
+                    if last_event_id:
+                        yield bus.RESYNC
+                while True:
+                    try:
+                        # Already encoded: the bus serialises each event once, for
+                        # everyone.
+                        yield sub.get(timeout=20)
+                    except Empty:
+                        yield bus.PING
+                        continue
+                    if sub.finished:
+                        return
         finally:
-            bus.BUS.unsubscribe(room_id, queue)
+            bus.BUS.unsubscribe(room_id, sub)
 
     return Response(events(), mimetype="text/event-stream", headers={
         "Cache-Control": "no-cache",
@@ -302,13 +349,18 @@ def rooms_events(room_id):
 #
 # RTS_TRANSCRIPT_TOKEN gates all of it when set. Left unset it is open, which is the
 # right default for a laptop and the wrong one for the internet: these are real
-# conversations people had. Set it in production and pass ?token= to read.
+# conversations people had. Set it in production and pass ?token= to read - or send it
+# as `Authorization: Bearer`, which is how a metrics scraper is usually configured.
 
 _TOKEN = os.environ.get("RTS_TRANSCRIPT_TOKEN", "").strip()
 
 
 def _may_read():
-    return not _TOKEN or request.args.get("token", "") == _TOKEN
+    if not _TOKEN:
+        return True
+    bearer = request.headers.get("Authorization", "")
+    return (request.args.get("token", "") == _TOKEN
+            or bearer.removeprefix("Bearer ").strip() == _TOKEN)
 
 
 @app.route("/transcripts", methods=["GET"])
@@ -323,7 +375,8 @@ def transcripts():
         limit = min(int(request.args.get("limit", 500)), 5000)
     except ValueError:
         limit = 500
-    return jsonify({"chats": transcript.chats(limit), "store": transcript.store().name}), 200
+    return jsonify({"chats": transcript.chats(limit), "store": transcript.store().name,
+                    "recorder": transcript.stats()}), 200
 
 
 @app.route("/database", methods=["GET"])
@@ -361,6 +414,68 @@ def database():
     }), 200
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics_text():
+    """Every engine metric, in Prometheus's text format.
+
+    Behind the archive's token, because how busy the service is and how many people
+    are in it right now is nobody's business but ours. Cheap to scrape: it reads
+    counters and calls a few gauge functions, and touches no store.
+    """
+    if not _may_read():
+        return jsonify({"error": "not allowed"}), 403
+    return Response(metrics.render(), mimetype="text/plain",
+                    headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+@app.route("/stats/latency", methods=["GET"])
+def stats_latency():
+    """Turn latency quantiles over a recent window, without reading a transcript back.
+
+    `?window=` is seconds, up to an hour (default). `?by=` is the comma-separated turn
+    attributes to keep apart - kind, code, provider, model, streamed - and the rest are
+    merged: `?by=code` is p95 for ASK against OK across everything. Default is all
+    five. See engine/sketch.py for what the numbers are and how close.
+    """
+    if not _may_read():
+        return jsonify({"error": "not allowed"}), 403
+    try:
+        window = int(request.args.get("window", sketch.SLOTS * sketch.SLOT_S))
+    except ValueError:
+        window = sketch.SLOTS * sketch.SLOT_S
+    by = request.args.get("by")
+    fields = [f.strip() for f in by.split(",") if f.strip()] if by else sketch.Key._fields
+    return jsonify(sketch.report(window, fields)), 200
+
+
+@app.route("/profile", methods=["GET"])
+def profile():
+    """Sample the live process for `?seconds=` (default 10) and return collapsed stacks.
+
+    For a flamegraph of our own Python while real turns are being played: pipe the body
+    into flamegraph.pl, or drop it on speedscope. `?hz=` overrides RTS_PROFILE_HZ,
+    `?tag=` keeps one of echo, stream, bot or sse, and `?all=1` adds the untagged
+    threads. The response arrives when the profile is done; one at a time, and 409 if
+    another is running. See engine/profiler.py.
+    """
+    if not _may_read():
+        return jsonify({"error": "not allowed"}), 403
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        hz = int(request.args["hz"]) if "hz" in request.args else None
+    except ValueError:
+        return jsonify({"error": "seconds and hz are numbers"}), 400
+    only = request.args.get("tag") or None
+    if only and only not in profiler.TAGS:
+        return jsonify({"error": f"tag is one of {', '.join(profiler.TAGS)}"}), 400
+    try:
+        stacks = profiler.profile(seconds, hz, only=only,
+                                  untagged=request.args.get("all") == "1")
+    except profiler.Busy as e:
+        return jsonify({"error": str(e)}), 409
+    return Response(stacks, mimetype="text/plain")
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "5000"))
     app.run(host="0.0.0.0", port=port, debug=True)
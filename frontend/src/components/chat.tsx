@@ -706,6 +706,16 @@ function Chat() {
         setDeadline(s.deadline_ms);
       },
       thinking: () => setBotThinking(true),
+      // Reconnected after a gap too long to replay: read the room again rather than
+      // trust a log with a hole in it.
+      resync: () => {
+        rooms.get(id).then(({ room: s, messages }) => {
+          setRoom(s);
+          setReverse(s.reverse);
+          setDeadline(s.deadline_ms);
+          setRoomMsgs(messages.map(m => asMessage(m, me)));
+        }).catch(() => {});
+      },
     });
 
     // A closing tab has to say so, or it stays seated in the rotation and every lap
@@ -195,6 +195,10 @@ export class Rooms {
    * EventSource rather than the hand-rolled reader `/stream` uses: this connection is
    * open for as long as you are in the room, and reconnecting after a dropped network
    * is behaviour worth getting for free rather than writing again.
+   *
+   * A dropped stream reconnects by itself and sends the last event id it saw, and the
+   * server replays whatever was said in between. `resync` is the server saying the gap
+   * was too long to replay, so the room has to be read again from the top.
    */
   watch(
     roomId: string,
@@ -202,6 +206,7 @@ export class Rooms {
       message: (m: RoomMessage) => void;
       state: (s: RoomState) => void;
       thinking?: () => void;
+      resync?: () => void;
     },
   ): () => void {
     const source = new EventSource(`${this.api}/rooms/${roomId}/events`);
@@ -218,6 +223,7 @@ export class Rooms {
     listen('message', on.message);
     listen('state', on.state);
     listen('thinking', on.thinking && (() => on.thinking!()));
+    listen('resync', on.resync && (() => on.resync!()));
     return () => source.close();
   }
 }